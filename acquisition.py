@@ -0,0 +1,140 @@
+import time
+import threading
+from array import array
+
+
+class RingBuffer(object):
+    # Fixed-size, array-backed ring of timestamped samples.
+    # There is exactly one writer (the sampling thread). Readers never
+    # take a lock: the writer fills a slot before publishing it by
+    # bumping self.count, and readers re-check self.count after copying
+    # to detect a window that was overwritten underneath them.
+
+    def __init__(self, size=256):
+        self.size = size
+        self.values = array('d', [0.0]) * size
+        self.times = array('d', [0.0]) * size
+
+        # total number of samples ever written
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def append(self, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        index = self.count % self.size
+        self.values[index] = value
+        self.times[index] = timestamp
+
+        # publish the slot only after it is completely written
+        self.count = self.count + 1
+
+    def latest(self):
+        # returns (timestamp, value) of the newest sample, or
+        # None if nothing has been written yet.
+        while True:
+            count = self.count
+            if count == 0:
+                return None
+            index = (count - 1) % self.size
+            sample = (self.times[index], self.values[index])
+            if self.count - count < self.size:
+                return sample
+
+    def window(self, samples=None):
+        # returns (times, values) arrays of the newest samples,
+        # oldest first.
+        while True:
+            count = self.count
+            length = min(count, self.size)
+            if samples is not None:
+                length = min(length, samples)
+
+            start = (count - length) % self.size
+            end = start + length
+            if end <= self.size:
+                times = self.times[start:end]
+                values = self.values[start:end]
+            else:
+                end = end - self.size
+                times = self.times[start:] + self.times[:end]
+                values = self.values[start:] + self.values[:end]
+
+            # retry if the writer lapped the oldest slot we copied
+            if self.count - count <= self.size - length:
+                return times, values
+
+    def clear(self):
+        self.count = 0
+
+
+class LoadCellSampler(object):
+    # Background acquisition engine. While running, this is the only
+    # code that talks to the NAU7802: it cycles through the requested
+    # channels, reads `dwell` conversions from each before switching
+    # (switching pays the multiplexer settling time), and appends every
+    # sample to that channel's ring buffer.
+
+    def __init__(self, load_cell, channels=(1,), size=256, dwell=10):
+        self.load_cell = load_cell
+        self.channels = tuple(channels)
+        self.dwell = dwell
+        self.buffers = {}
+        for channel in self.channels:
+            self.buffers[channel] = RingBuffer(size)
+
+        self.error = None
+        self.__thread__ = None
+        self.__stop__ = threading.Event()
+
+    def isRunning(self):
+        return self.__thread__ is not None and self.__thread__.is_alive()
+
+    def start(self):
+        if not self.isRunning():
+            self.__stop__.clear()
+            self.error = None
+            self.__thread__ = threading.Thread(target=self.__run__, name="LoadCellSampler", daemon=True)
+            self.__thread__.start()
+
+    def stop(self, timeout=None):
+        self.__stop__.set()
+        if self.__thread__ is not None:
+            self.__thread__.join(timeout)
+            self.__thread__ = None
+
+    def latest(self, channel=1):
+        return self.buffers[channel].latest()
+
+    def window(self, channel=1, samples=None):
+        return self.buffers[channel].window(samples)
+
+    def __run__(self):
+        device = self.load_cell.device
+        try:
+            # let a non-blocking power-up finish first
+            while not device.ready:
+                if self.__stop__.wait(0.010):
+                    return
+
+            while not self.__stop__.is_set():
+                for channel in self.channels:
+                    if len(self.channels) > 1 or device.channel != channel:
+                        device.channel = channel
+
+                    buffer = self.buffers[channel]
+                    count = 0
+                    while count < self.dwell and not self.__stop__.is_set():
+                        if self.load_cell.wait_for_sample():
+                            buffer.append(device.read())
+                            count = count + 1
+                    # end while
+                # end for
+            # end while
+        except Exception as e:
+            # keep the failure around for the owner to inspect
+            self.error = e
+            print("LoadCellSampler stopped: %s" % e)
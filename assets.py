@@ -0,0 +1,41 @@
+import os
+import threading
+
+import pygame
+
+# root folder of the image assets
+IMAGE_PATH = os.path.join('resource', 'img')
+
+
+__images__ = {}
+__images_lock__ = threading.Lock()
+
+
+def load_image(name, alpha=False):
+    # Loads an image from IMAGE_PATH and converts it to the display
+    # pixel format once; later calls return the same surface, so
+    # callers must copy it before drawing on it. Needs the display
+    # mode to be set.
+    key = (name, alpha)
+    with __images_lock__:
+        image = __images__.get(key)
+        if image is None:
+            image = pygame.image.load(os.path.join(IMAGE_PATH, name), name)
+            if alpha:
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
+            __images__[key] = image
+        return image
+
+
+def preload(*names):
+    # decodes and converts images ahead of the first screen using them
+    for name in names:
+        load_image(name)
+
+
+def clear():
+    # drops every cached image, e.g. after the display mode changes
+    with __images_lock__:
+        __images__.clear()
@@ -24,6 +24,7 @@ Implementation Notes
 
 import time
 import struct
+import threading
 
 from adafruit_bus_device.i2c_device import I2CDevice
 from adafruit_register.i2c_struct import ROUnaryStruct
@@ -51,6 +52,18 @@ _PGA = 0x1B  # Programmable Gain Amplifier  RW
 _PWR_CTRL = 0x1C  # Power Control  RW
 _REV_ID = 0x1F  # Chip Revision ID  R-
 
+# Configuration bit fields that can be served from the register shadow;
+# register, bit position, and bit width of each
+_SHADOW_FIELDS = {
+    "_c1_gains": (_CTRL1, 0, 3),
+    "_c1_vldo_volts": (_CTRL1, 3, 3),
+    "_c2_cal_mode": (_CTRL2, 0, 2),
+    "_c2_conv_rate": (_CTRL2, 4, 3),
+    "_c2_chan_select": (_CTRL2, 7, 1),
+    "_pga_ldo_mode": (_PGA, 6, 1),
+    "_pc_cap_enable": (_PWR_CTRL, 7, 1),
+}
+
 # pylint: disable=too-few-public-methods
 class LDOVoltage:
     """Internal low-dropout voltage regulator settings."""
@@ -83,6 +96,25 @@ class ConversionRate:
     RATE_320SPS = 0x7  # 320 samples/sec; _CTRL2[6:4] = 7
 
 
+# Samples per second for each conversion rate setting
+_RATE_SPS = {
+    ConversionRate.RATE_10SPS: 10,
+    ConversionRate.RATE_20SPS: 20,
+    ConversionRate.RATE_40SPS: 40,
+    ConversionRate.RATE_80SPS: 80,
+    ConversionRate.RATE_320SPS: 320,
+}
+
+# Analog multiplexer settling time in seconds for each conversion rate
+_SETTLING_TIME = {
+    ConversionRate.RATE_10SPS: 0.400,
+    ConversionRate.RATE_20SPS: 0.200,
+    ConversionRate.RATE_40SPS: 0.100,
+    ConversionRate.RATE_80SPS: 0.050,
+    ConversionRate.RATE_320SPS: 0.020,
+}
+
+
 class CalibrationMode:
     """Calibration mode state settings."""
 
@@ -95,29 +127,141 @@ class NAU7802:
     """The primary NAU7802 class."""
 
     # pylint: disable=too-many-instance-attributes
-    def __init__(self, i2c_bus, address=0x2A, active_channels=1):
+    def __init__(
+        self,
+        i2c_bus,
+        address=0x2A,
+        active_channels=1,
+        burst=True,
+        conversion_rate=10,
+        settle_samples=0,
+        blocking=True,
+        shadow=False,
+    ):
         """Instantiate NAU7802; LDO 3v0 volts, gain 128, 10 samples per second
-        conversion rate, disabled ADC chopper clock, low ESR caps, and PGA output
-        stabilizer cap if in single channel mode. Returns True if successful."""
+        conversion rate (default), disabled ADC chopper clock, low ESR caps, and
+        PGA output stabilizer cap if in single channel mode. ADC results are
+        fetched with a single auto-increment burst read unless burst is False.
+        When settle_samples is non-zero, channel switches discard that many
+        conversions instead of sleeping. With blocking False, returns
+        immediately and powers up in the background of poll() calls; see
+        begin(). With shadow True, CTRL1, CTRL2, PGA, and PWR_CTRL are cached
+        in memory, configuration reads are served from the cache, and
+        configuration writes are sent as whole bytes. Returns True if
+        successful."""
         self.i2c_device = I2CDevice(i2c_bus, address)
+        self._act_channels = active_channels
+        self._conv_rate = conversion_rate
+        self._last_read = 0.0  # time.monotonic() of the last ADC read
+        self.settle_samples = settle_samples
+        self._calib_mode = None  # Initialize for later use
+        self._adc_out = None  # Initialize for later use
+        # Preallocated burst read buffers; ADCO_B2..B0 land in bytes [0:3] and
+        # byte [3] stays zero so the result unpacks as a 32-bit signed integer
+        self.burst = burst
+        self._adc_cmd = bytearray([_ADCO_B2])
+        self._adc_buf = bytearray(4)
+        # Register shadow; register address -> last known byte value
+        self._shadow = {} if shadow else None
+        self._deferred = None  # Registers awaiting a batched write
+        self._reg_buf = bytearray(2)
+        # Non-blocking power-up sequence state; see begin() and poll()
+        self._init_step = None
+        self._init_deadline = 0.0
+        self._init_timeout = 0.0
+        self._init_calibration = None
+        self._init_error = None
+        self._init_lock = threading.Lock()  # One caller advances a step at a time
+        if not blocking:
+            self.begin()
+            return
         if not self.reset():
             raise RuntimeError("NAU7802 device could not be reset")
         if not self.enable(True):
             raise RuntimeError("NAU7802 device could not be enabled")
+        self._configure()
+
+    def _configure(self):
+        """Write the power-on register configuration. With the register
+        shadow enabled the shadowed registers are read once and the new
+        configuration is written back in two transactions."""
+        self._load_shadow()
+        self._begin_batch()
         self.ldo_voltage = "3V0"  # 3.0-volt internal analog power (AVDD)
         self._pu_ldo_source = True  # Internal analog power (AVDD)
         self.gain = 128  # X128
-        self._c2_conv_rate = ConversionRate.RATE_10SPS  # 10 SPS; default
+        self.conversion_rate = self._conv_rate  # 10 SPS; default
         self._adc_chop_clock = 0x3  # 0x3 = Disable ADC chopper clock
-        self._pga_ldo_mode = 0x0  # 0x0 = Use low ESR capacitors
-        self._act_channels = active_channels
+        self._set_field("_pga_ldo_mode", 0x0)  # 0x0 = Use low ESR capacitors
         # 0x1 = Enable PGA out stabilizer cap for single channel use
-        self._pc_cap_enable = 0x1
+        self._set_field("_pc_cap_enable", 0x1)
         if self._act_channels == 2:
             # 0x0 = Disable PGA out stabilizer cap for dual channel use
-            self._pc_cap_enable = 0x0
-        self._calib_mode = None  # Initialize for later use
-        self._adc_out = None  # Initialize for later use
+            self._set_field("_pc_cap_enable", 0x0)
+        self._end_batch()
+
+    def _load_shadow(self):
+        """Fill the register shadow from the device; CTRL1..CTRL2 and
+        PGA..PWR_CTRL are each read in one auto-increment transaction."""
+        if self._shadow is None:
+            return
+        with self.i2c_device as i2c:
+            for first in (_CTRL1, _PGA):
+                i2c.write_then_readinto(bytes([first]), self._reg_buf)
+                self._shadow[first] = self._reg_buf[0]
+                self._shadow[first + 1] = self._reg_buf[1]
+
+    def _get_field(self, name):
+        """Read a configuration bit field, from the shadow when enabled."""
+        if self._shadow is None:
+            return getattr(self, name)
+        register, shift, width = _SHADOW_FIELDS[name]
+        return (self._shadow[register] >> shift) & ((1 << width) - 1)
+
+    def _set_field(self, name, value):
+        """Write a configuration bit field. With the shadow enabled the
+        whole register byte is written from the cache, or deferred until
+        _end_batch() while a batch is open."""
+        if self._shadow is None:
+            setattr(self, name, value)
+            return
+        register, shift, width = _SHADOW_FIELDS[name]
+        mask = ((1 << width) - 1) << shift
+        self._shadow[register] = (self._shadow[register] & ~mask) | (
+            (value << shift) & mask
+        )
+        if self._deferred is not None:
+            self._deferred.add(register)
+        else:
+            self._write_registers([register])
+
+    def _begin_batch(self):
+        """Defer shadowed register writes until _end_batch()."""
+        if self._shadow is not None:
+            self._deferred = set()
+
+    def _end_batch(self):
+        """Write all deferred registers."""
+        if self._deferred is not None:
+            registers = self._deferred
+            self._deferred = None
+            self._write_registers(registers)
+
+    def _write_registers(self, registers):
+        """Write shadowed registers as whole bytes; one auto-increment
+        transaction per run of consecutive register addresses."""
+        runs = []
+        for register in sorted(registers):
+            if runs and runs[-1][-1] == register - 1:
+                runs[-1].append(register)
+            else:
+                runs.append([register])
+        with self.i2c_device as i2c:
+            for run in runs:
+                buffer = bytearray([run[0]])
+                for register in run:
+                    buffer.append(self._shadow[register])
+                i2c.write(buffer)
 
     # DEFINE I2C DEVICE BITS, NYBBLES, BYTES, AND REGISTERS
     # Chip Revision  R-
@@ -171,7 +315,7 @@ class NAU7802:
     @property
     def channel(self):
         "Selected channel number (1 or 2)."
-        return self._c2_chan_select + 1
+        return self._get_field("_c2_chan_select") + 1
 
     @channel.setter
     def channel(self, chan=1):
@@ -180,13 +324,47 @@ class NAU7802:
         approximately 400ms at 10SPS, 200ms at 20SPS, 100ms at 40SPS,
         50ms at 80SPS, and 20ms at 320SPS."""
         if chan == 1:
-            self._c2_chan_select = 0x0
-            time.sleep(0.400)  # 400ms settling time for 10SPS
+            self._set_field("_c2_chan_select", 0x0)
         elif chan == 2 and self._act_channels == 2:
-            self._c2_chan_select = 0x1
-            time.sleep(0.400)  # 400ms settling time for 10SPS
+            self._set_field("_c2_chan_select", 0x1)
         else:
             raise ValueError("Invalid Channel Number")
+        self._settle()
+
+    def _settle(self):
+        """Wait out the multiplexer settling time for the active conversion
+        rate, or discard settle_samples conversions if that is set."""
+        if self.settle_samples > 0:
+            # The conversion in progress started on the previous channel
+            self._last_read = time.monotonic()
+            for _ in range(self.settle_samples):
+                if self.wait_for_data(self._settle_time + self._conv_period):
+                    self.read()
+        else:
+            time.sleep(self._settle_time)
+
+    @property
+    def conversion_rate(self):
+        """ADC conversion rate in samples per second."""
+        return self._conv_rate
+
+    @conversion_rate.setter
+    def conversion_rate(self, rate=10):
+        """Select the ADC conversion rate. Valid rates are 10, 20, 40, 80, and
+        320 samples per second. The channel settling time follows the selected
+        rate. Calibrate again after changing the rate."""
+        if not "RATE_" + str(rate) + "SPS" in dir(ConversionRate):
+            raise ValueError("Invalid Conversion Rate")
+        setting = getattr(ConversionRate, "RATE_" + str(rate) + "SPS")
+        self._set_field("_c2_conv_rate", setting)
+        self._conv_rate = rate
+        self._conv_period = 1 / _RATE_SPS[setting]
+        self._settle_time = _SETTLING_TIME[setting]
+
+    @property
+    def settling_time(self):
+        """Channel settling time in seconds at the active conversion rate."""
+        return self._settle_time
 
     @property
     def ldo_voltage(self):
@@ -200,11 +378,11 @@ class NAU7802:
             raise ValueError("Invalid LDO Voltage")
         self._ldo_voltage = voltage
         if self._ldo_voltage == "2V4":
-            self._c1_vldo_volts = LDOVoltage.LDO_2V4
+            self._set_field("_c1_vldo_volts", LDOVoltage.LDO_2V4)
         elif self._ldo_voltage == "2V7":
-            self._c1_vldo_volts = LDOVoltage.LDO_2V7
+            self._set_field("_c1_vldo_volts", LDOVoltage.LDO_2V7)
         elif self._ldo_voltage == "3V0":
-            self._c1_vldo_volts = LDOVoltage.LDO_3V0
+            self._set_field("_c1_vldo_volts", LDOVoltage.LDO_3V0)
 
     @property
     def gain(self):
@@ -219,21 +397,21 @@ class NAU7802:
             raise ValueError("Invalid Gain Factor")
         self._gain = factor
         if self._gain == 1:
-            self._c1_gains = Gain.GAIN_X1
+            self._set_field("_c1_gains", Gain.GAIN_X1)
         elif self._gain == 2:
-            self._c1_gains = Gain.GAIN_X2
+            self._set_field("_c1_gains", Gain.GAIN_X2)
         elif self._gain == 4:
-            self._c1_gains = Gain.GAIN_X4
+            self._set_field("_c1_gains", Gain.GAIN_X4)
         elif self._gain == 8:
-            self._c1_gains = Gain.GAIN_X8
+            self._set_field("_c1_gains", Gain.GAIN_X8)
         elif self._gain == 16:
-            self._c1_gains = Gain.GAIN_X16
+            self._set_field("_c1_gains", Gain.GAIN_X16)
         elif self._gain == 32:
-            self._c1_gains = Gain.GAIN_X32
+            self._set_field("_c1_gains", Gain.GAIN_X32)
         elif self._gain == 64:
-            self._c1_gains = Gain.GAIN_X64
+            self._set_field("_c1_gains", Gain.GAIN_X64)
         elif self._gain == 128:
-            self._c1_gains = Gain.GAIN_X128
+            self._set_field("_c1_gains", Gain.GAIN_X128)
 
     def enable(self, power=True):
         """Enable(start) or disable(stop) the internal analog and digital
@@ -251,15 +429,41 @@ class NAU7802:
         time.sleep(0.010)  # Wait 10ms (200us minimum)
         return False
 
+    @property
+    def conversion_period(self):
+        """Seconds between conversions at the active conversion rate."""
+        return self._conv_period
+
     def available(self):
         """Read the ADC data-ready status. True when data is available; False when
         ADC data is unavailable."""
         return self._pu_cycle_ready
 
+    def wait_for_data(self, timeout=None):
+        """Wait for the next conversion without busy-polling the bus. Sleeps
+        until the next conversion is expected at the active conversion rate,
+        then checks the data-ready bit every eighth of a conversion period.
+        True when data is available; False if timeout seconds expire first."""
+        now = time.monotonic()
+        deadline = None if timeout is None else now + timeout
+        expected = self._last_read + self._conv_period
+        if deadline is not None:
+            expected = min(expected, deadline)
+        if expected > now:
+            time.sleep(expected - now)
+        while not self._pu_cycle_ready:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self._conv_period / 8)
+        return True
+
     def read(self):
         """Reads the 24-bit ADC data. Returns a signed integer value with
         24-bit resolution. Assumes that the ADC data-ready bit was checked
         to be True."""
+        self._last_read = time.monotonic()
+        if self.burst:
+            return self._read_burst()
         adc = self._adc_out_2 << 24  # [31:24] << MSByte
         adc = adc | (self._adc_out_1 << 16)  # [23:16] << MidSByte
         adc = adc | (self._adc_out_0 << 8)  # [15: 8] << LSByte
@@ -268,6 +472,28 @@ class NAU7802:
         self._adc_out = value / 128  # Restore to 24-bit signed integer value
         return self._adc_out
 
+    def _read_burst(self):
+        """Reads ADCO_B2, ADCO_B1, and ADCO_B0 in one auto-increment I2C
+        transaction so the three bytes always belong to the same conversion."""
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(self._adc_cmd, self._adc_buf, in_end=3)
+        value = struct.unpack_from(">i", self._adc_buf)[0]
+        self._adc_out = value / 128  # Restore to 24-bit signed integer value
+        return self._adc_out
+
+    def read_into(self, buffer, start=0, end=None, timeout=None):
+        """Fills buffer[start:end] with consecutive ADC conversions, waiting for
+        data-ready before each one. The buffer may be a list or any array that
+        accepts float values. Stops early if a conversion does not arrive within
+        timeout seconds. Returns the number of samples read."""
+        if end is None:
+            end = len(buffer)
+        for index in range(start, end):
+            if not self.wait_for_data(timeout):
+                return index - start
+            buffer[index] = self.read()
+        return end - start
+
     def reset(self):
         """Resets all device registers and enables digital system power.
         Returns the power ready status bit value: True when system is ready;
@@ -279,19 +505,124 @@ class NAU7802:
         time.sleep(0.750)  # Wait 750ms; 400ms minimum
         return self._pu_ready
 
+    def begin(self, calibrate="INTERNAL"):
+        """Start the non-blocking power-up sequence: register reset, digital
+        and analog power-up, configuration, and optionally calibration in the
+        given mode (None to skip). Returns immediately; call poll() until it
+        returns True."""
+        with self._init_lock:
+            self._init_calibration = calibrate
+            self._pu_reg_reset = True  # Reset all registers
+            self._init_step = "reset"
+            self._init_deadline = time.monotonic() + 0.100  # 100ms; 10ms minimum
+
+    @property
+    def ready(self):
+        """True once the device is powered up, configured and calibrated.
+        Advances the non-blocking power-up sequence when one is running."""
+        return self.poll()
+
+    def poll(self):
+        """Advance the non-blocking power-up sequence by at most one step
+        without sleeping. Returns True when the device is ready for use.
+        Raises RuntimeError if a step fails or times out, and again on every
+        later call until begin() is called to retry. Safe to call from several
+        threads; a caller arriving while another one is running a step waits
+        for it and then sees its result."""
+        if self._init_step is None:
+            return True
+        with self._init_lock:
+            return self._poll_step()
+
+    def _poll_step(self):
+        """Run the next power-up step if it is due; called with the power-up
+        lock held."""
+        if self._init_step is None:
+            return True
+        if self._init_step == "failed":
+            raise RuntimeError(self._init_error)
+        now = time.monotonic()
+        if now < self._init_deadline:
+            return False
+        if self._init_step == "reset":
+            self._pu_reg_reset = False
+            self._pu_digital = True
+            self._init_step = "digital"
+            self._init_deadline = now + 0.400  # 400ms minimum
+            self._init_timeout = now + 0.750
+        elif self._init_step == "digital":
+            if not self._pu_ready:
+                if now >= self._init_timeout:
+                    self._fail("NAU7802 device could not be reset")
+                self._init_deadline = now + 0.010
+                return False
+            self._enable = True
+            self._pu_analog = True
+            self._pu_digital = True
+            self._init_step = "analog"
+            self._init_deadline = now + 0.400  # 400ms minimum
+            self._init_timeout = now + 0.750
+        elif self._init_step == "analog":
+            if not self._pu_ready:
+                if now >= self._init_timeout:
+                    self._fail("NAU7802 device could not be enabled")
+                self._init_deadline = now + 0.010
+                return False
+            self._pu_start = True  # Start acquisition system cycling
+            self._configure()
+            if self._init_calibration is None:
+                self._init_step = None
+                return True
+            self.start_calibration(self._init_calibration)
+            self._init_step = "calibrate"
+            self._init_deadline = now + 0.010
+        elif self._init_step == "calibrate":
+            done = self.calibration_complete()
+            if done is None:
+                self._init_deadline = now + 0.010  # 10ms
+                return False
+            if not done:
+                self._fail("NAU7802 device could not be calibrated")
+            self._init_step = None
+            return True
+        return False
+
+    def _fail(self, message):
+        """Leave the power-up sequence in the failed state and raise."""
+        self._init_step = "failed"
+        self._init_error = message
+        raise RuntimeError(message)
+
     def calibrate(self, mode="INTERNAL"):
         """Perform the calibration procedure. Valid calibration modes
         are 'INTERNAL', 'OFFSET', and 'GAIN'. True if successful."""
+        self.start_calibration(mode)
+        while self.calibration_complete() is None:
+            time.sleep(0.010)  # 10ms
+        return not self._c2_cal_error
+
+    def start_calibration(self, mode="INTERNAL"):
+        """Start the calibration procedure without waiting for it. Valid
+        calibration modes are 'INTERNAL', 'OFFSET', and 'GAIN'."""
         if not mode in dir(CalibrationMode):
             raise ValueError("Invalid Calibration Mode")
         self._calib_mode = mode
         if self._calib_mode == "INTERNAL":  # Internal PGA offset (zero setting)
-            self._c2_cal_mode = CalibrationMode.INTERNAL
+            self._set_field("_c2_cal_mode", CalibrationMode.INTERNAL)
         elif self._calib_mode == "OFFSET":  # External PGA offset (zero setting)
-            self._c2_cal_mode = CalibrationMode.OFFSET
+            self._set_field("_c2_cal_mode", CalibrationMode.OFFSET)
         elif self._calib_mode == "GAIN":  # External PGA full-scale gain setting
-            self._c2_cal_mode = CalibrationMode.GAIN
+            self._set_field("_c2_cal_mode", CalibrationMode.GAIN)
         self._c2_cal_start = True
-        while self._c2_cal_start:
-            time.sleep(0.010)  # 10ms
+
+    def calibration_complete(self):
+        """Check on a calibration started with start_calibration(). None while
+        still running; True if successful; False on a calibration error."""
+        if self._c2_cal_start:
+            return None
+        if self._shadow is not None:
+            # The device updated CALS and CAL_ERR behind the shadow
+            with self.i2c_device as i2c:
+                i2c.write_then_readinto(bytes([_CTRL2]), self._reg_buf, in_end=1)
+            self._shadow[_CTRL2] = self._reg_buf[0]
         return not self._c2_cal_error
\ No newline at end of file
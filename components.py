@@ -1,5 +1,6 @@
 import time
 import pygame
+from fonts import get_font, render_text
 
 # CONSTANTS
 SCREEN_SIZE = (480,320)
@@ -11,12 +12,20 @@ COLOR_GREEN = (0, 255, 0)
 
 
 class BaseComponent(object):
+
+    # components only redraw while dirty. draw() returns the list
+    # of rects it changed so the screen can update just those.
+    dirty = True
+
+    def mark_dirty(self):
+        self.dirty = True
+
     def input(self, events):
         pass
     def update(self, events):
         pass
-    def draw(self, screen_manager):
-        pass
+    def draw(self, surface):
+        return []
 
 class Button(BaseComponent):
 
@@ -30,7 +39,7 @@ class Button(BaseComponent):
         self.y = int(y)
         self.width = width
         self.height = height
-        self.base_font = pygame.font.Font(None, 21)
+        self.base_font = get_font()
         self.text = text
         self.pressed = False
         self.callback = callback
@@ -44,9 +53,10 @@ class Button(BaseComponent):
             self.height - 2 - (self.__border_width__ * 2) \
         )
 
-        self.text_surface = self.base_font.render(text, True, pygame.Color(COLOR_BLACK))
+        self.text_surface = render_text(self.base_font, text, COLOR_BLACK)
 
     def input(self, events):
+        was_pressed = self.pressed
         for e in events:
             if e.type == pygame.MOUSEBUTTONDOWN:
                 if self.button_rect.collidepoint(e.pos):
@@ -57,9 +67,14 @@ class Button(BaseComponent):
                     self.pressed = False
             elif e.type == pygame.MOUSEBUTTONUP:
                 self.pressed = False
+        if self.pressed != was_pressed:
+            self.dirty = True
 
     def draw(self, surface):
 
+        if not self.dirty:
+            return []
+
         # draw the black rectangle
         pygame.draw.rect(surface, pygame.Color(COLOR_BLACK), self.black_rect)
         
@@ -76,12 +91,15 @@ class Button(BaseComponent):
         text_y = (self.button_rect.y + (self.button_rect.height / 2)) - (self.text_surface.get_rect().height / 2)
         surface.blit(self.text_surface, (text_x, text_y))
 
-class InputField(object):
-    def __init__(self, width=200, height=32, justification="center", y=40, border_width=2):
+        self.dirty = False
+        return [self.black_rect]
+
+class InputField(BaseComponent):
+    def __init__(self, width=200, height=32, justification="center", y=40, border_width=2, background=COLOR_WHITE):
 
         self.x = int((SCREEN_SIZE[0] / 2) - (width / 2))
         self.y = y
-        self.base_font = pygame.font.Font(None, 21)
+        self.base_font = get_font()
         self.width = width
         self.height = height
         self.active_color = pygame.Color('lightskyblue3')
@@ -97,25 +115,40 @@ class InputField(object):
         self.input_rect = pygame.Rect(self.x, self.y, \
                                         self.width, self.height)
 
+        # strip above the field the label is drawn in; it is cleared
+        # with the background color before the label is redrawn
+        self.background = pygame.Color(background)
+        self.label_rect = pygame.Rect(0, self.y - self.height, \
+                                        SCREEN_SIZE[0], self.height - self.border_width)
+
     def set_label_text(self, text):
-        self.label_text = text
+        if text != self.label_text:
+            self.label_text = text
+            self.dirty = True
 
     def set_user_text(self, text):
-        self.user_text = text
+        if text != self.user_text:
+            self.user_text = text
+            self.dirty = True
     
     def input(self, events):
         for e in events:
             if e.type == pygame.MOUSEBUTTONDOWN:
-                if self.input_rect.collidepoint(e.pos):
+                if self.input_rect.collidepoint(e.pos) and not self.active:
                     self.active = True
+                    self.dirty = True
 
     def update(self, events):
         pass
 
     def draw(self, surface):
-        
+
+        if not self.dirty:
+            return []
+
         # draws the label
-        label = self.base_font.render(self.label_text, True, pygame.Color(COLOR_BLACK))
+        pygame.draw.rect(surface, self.background, self.label_rect)
+        label = render_text(self.base_font, self.label_text, COLOR_BLACK)
         label_x = (SCREEN_SIZE[0] / 2) - (label.get_rect().width / 2)
         label_y = self.y - self.height
         surface.blit(label, (label_x, label_y))
@@ -130,9 +163,12 @@ class InputField(object):
             pygame.draw.rect(surface, self.passive_color, self.input_rect)
         
         # draws the text surface
-        self.text_surface = self.base_font.render(self.user_text, True, pygame.Color(COLOR_BLACK))
+        self.text_surface = render_text(self.base_font, self.user_text, COLOR_BLACK)
         surface.blit(self.text_surface, (self.input_rect.x+5, self.input_rect.y+5))
 
+        self.dirty = False
+        return [self.label_rect, self.border_rect]
+
 class AlertPopup(object):
     pass
 
@@ -162,6 +198,13 @@ class OnLoopTimer(object):
             if self.callback is not None:
                 self.callback()
 
+    def deadline(self):
+        # time.time() at which the callback is due, None
+        # until the timer has been started
+        if self.started is None:
+            return None
+        return self.started + self.interval
+
     def destroy(self):
         self = None            
         
\ No newline at end of file
@@ -1,9 +1,459 @@
+import time
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import date
 
 # base class uses this filename
 DB_FILENAME = 'db.sqlite3'
 
+# NORMAL is safe in WAL mode: a power cut can lose the last
+# commits but never corrupts the database, and commits do not
+# fsync the SD card
+DB_SYNCHRONOUS = 'NORMAL'
+
+# prepared statements kept per connection
+DB_CACHED_STATEMENTS = 128
+
+# write-behind queue flush thresholds
+WRITE_BEHIND_ROWS = 64
+WRITE_BEHIND_DELAY = 2.0
+
+# busy (locked database) retries before a batch counts as failed
+WRITE_BEHIND_RETRIES = 8
+
+class ConnectionManager(object):
+    # One long lived connection per thread. Connections are opened
+    # in WAL mode in autocommit; transaction() groups statements
+    # explicitly. sqlite3 keeps the prepared statement for each SQL
+    # string in a per connection cache, so repeated statements skip
+    # the parse step.
+
+    def __init__(self, filename=DB_FILENAME, synchronous=DB_SYNCHRONOUS, cached_statements=DB_CACHED_STATEMENTS):
+        self.filename = filename
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+
+        self.__local__ = threading.local()
+        self.__connections__ = []
+        self.__lock__ = threading.Lock()
+
+    def connection(self):
+        con = getattr(self.__local__, 'connection', None)
+        if con is None:
+            con = sqlite3.connect(self.filename, isolation_level=None, \
+                cached_statements=self.cached_statements, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=%s" % self.synchronous)
+            con.execute("PRAGMA temp_store=MEMORY")
+            con.execute("PRAGMA foreign_keys=ON")
+            self.__local__.connection = con
+            self.__local__.depth = 0
+            with self.__lock__:
+                self.__connections__.append(con)
+        return con
+
+    def execute(self, statement, parameters=()):
+        return self.connection().execute(statement, parameters).fetchall()
+
+    def executemany(self, statement, rows):
+        con = self.connection()
+        with self.transaction():
+            con.executemany(statement, rows)
+
+    @contextmanager
+    def transaction(self, durable=False):
+        # BEGIN IMMEDIATE takes the write lock up front. Nested
+        # transactions join the outermost one. A durable transaction
+        # commits with synchronous=FULL so it is on the card when
+        # the block exits; a durable nested one makes the outermost
+        # commit sync the log.
+        con = self.connection()
+        if self.__local__.depth > 0:
+            if durable:
+                self.__local__.durable = True
+            self.__local__.depth = self.__local__.depth + 1
+            try:
+                yield con
+            finally:
+                self.__local__.depth = self.__local__.depth - 1
+            return
+
+        if durable:
+            con.execute("PRAGMA synchronous=FULL")
+        con.execute("BEGIN IMMEDIATE")
+        self.__local__.depth = 1
+        self.__local__.durable = False
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        else:
+            con.execute("COMMIT")
+            if self.__local__.durable and not durable:
+                # synchronous cannot change inside a transaction;
+                # a checkpoint syncs the log it just committed to
+                con.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        finally:
+            self.__local__.depth = 0
+            self.__local__.durable = False
+            if durable:
+                con.execute("PRAGMA synchronous=%s" % self.synchronous)
+
+    def in_transaction(self):
+        # True inside a transaction() block on the calling thread
+        return getattr(self.__local__, 'depth', 0) > 0
+
+    def close(self):
+        # closes the calling thread's connection
+        con = getattr(self.__local__, 'connection', None)
+        if con is not None:
+            self.__local__.connection = None
+            with self.__lock__:
+                self.__connections__.remove(con)
+            con.close()
+
+    def close_all(self):
+        # for shutdown, once no other thread is using the database
+        with self.__lock__:
+            connections = self.__connections__
+            self.__connections__ = []
+        for con in connections:
+            con.close()
+        self.__local__ = threading.local()
+
+__connection_manager__ = None
+
+def get_connection_manager():
+    # the process wide connection manager, created on first use
+    global __connection_manager__
+    if __connection_manager__ is None:
+        __connection_manager__ = ConnectionManager()
+    return __connection_manager__
+
+class WriteBehindQueue(object):
+    # Buffers inserts in memory and writes them from a background
+    # thread, one transaction per batch. A batch is written once
+    # max_rows are queued or the oldest row is max_delay seconds
+    # old. barrier() blocks until everything queued before it is
+    # committed durably, for records the caller cannot lose
+    # (e.g. a confirmed dose).
+    #
+    # A batch that fails because the database is busy is kept and
+    # retried. Any other failure is narrowed down by writing the
+    # batch's rows one at a time; the rows that still fail are
+    # dropped and the error is raised by the next flush() or
+    # barrier() of the thread that queued them, and only that one.
+
+    def __init__(self, connection_manager=None, max_rows=WRITE_BEHIND_ROWS, max_delay=WRITE_BEHIND_DELAY,
+                 max_retries=WRITE_BEHIND_RETRIES):
+        self.connection_manager = connection_manager
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+
+        self.__condition__ = threading.Condition()
+        self.__pending__ = []
+        self.__oldest__ = None
+        self.__flush_requested__ = False
+        self.__durable_requested__ = False
+        self.__thread__ = None
+        self.__running__ = False
+
+        # rows ever queued / rows resolved / rows resolved by a
+        # durable batch. A row is resolved once it is committed or
+        # dropped with its error recorded for the queueing thread.
+        # Only durable batches move __synced__, so a barrier cannot
+        # be released by a batch already in flight without one.
+        self.__queued__ = 0
+        self.__written__ = 0
+        self.__synced__ = 0
+
+        # thread ident -> first unreported error for its rows
+        self.__failures__ = {}
+
+        # statistics
+        self.batches = 0
+        self.rows = 0
+        self.durable_batches = 0
+        self.retries = 0
+        self.failed_rows = 0
+
+    @property
+    def connections(self):
+        if self.connection_manager is None:
+            return get_connection_manager()
+        return self.connection_manager
+
+    def put(self, statement, parameters=()):
+        with self.__condition__:
+            if len(self.__pending__) == 0:
+                self.__oldest__ = time.monotonic()
+            self.__pending__.append((statement, parameters, threading.get_ident()))
+            self.__queued__ = self.__queued__ + 1
+            self.__start__()
+            if len(self.__pending__) >= self.max_rows:
+                self.__condition__.notify()
+            elif len(self.__pending__) == 1:
+                # wake the writer to arm the delay
+                self.__condition__.notify()
+            return self.__queued__
+
+    def flush(self, durable=False, timeout=None):
+        # writes everything queued so far and waits for it; durable
+        # also waits for it to be synced. Returns False on timeout;
+        # raises if a row this thread queued failed to write.
+        with self.__condition__:
+            target = self.__queued__
+            if durable:
+                done = lambda: self.__synced__ >= target
+            else:
+                done = lambda: self.__written__ >= target
+
+            if not done():
+                if self.connections.in_transaction():
+                    # the writer would wait on this thread's write lock
+                    raise RuntimeError("Cannot wait for the write queue inside a transaction.")
+                self.__flush_requested__ = True
+                self.__durable_requested__ = self.__durable_requested__ or durable
+                self.__start__()
+                self.__condition__.notify()
+
+                if not self.__condition__.wait_for(done, timeout):
+                    return False
+            # end if
+
+            error = self.__failures__.pop(threading.get_ident(), None)
+            if error is not None:
+                raise error
+            return True
+
+    def barrier(self, timeout=None):
+        # durability barrier: returns once every row queued
+        # before the call has been synced to the card
+        return self.flush(durable=True, timeout=timeout)
+
+    def pending(self):
+        with self.__condition__:
+            return len(self.__pending__)
+
+    def stop(self):
+        # writes what is left and stops the writer thread
+        with self.__condition__:
+            self.__running__ = False
+            self.__condition__.notify()
+        if self.__thread__ is not None:
+            self.__thread__.join()
+            self.__thread__ = None
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "batches": self.batches,
+            "rows": self.rows,
+            "durable_batches": self.durable_batches,
+            "rows_per_batch": self.rows / self.batches if self.batches else 0.0,
+            "retries": self.retries,
+            "failed_rows": self.failed_rows,
+        }
+
+    def __start__(self):
+        if self.__thread__ is None:
+            self.__running__ = True
+            self.__thread__ = threading.Thread(target=self.__run__, name="WriteBehindQueue", daemon=True)
+            self.__thread__.start()
+
+    def __run__(self):
+        attempts = 0
+        while True:
+            with self.__condition__:
+                while self.__running__ and not self.__flush_requested__ and \
+                        len(self.__pending__) < self.max_rows:
+                    if len(self.__pending__) == 0:
+                        self.__condition__.wait()
+                        continue
+                    delay = self.__oldest__ + self.max_delay - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.__condition__.wait(delay)
+                # end while
+
+                if not self.__running__ and len(self.__pending__) == 0:
+                    return
+
+                rows = self.__pending__
+                durable = self.__durable_requested__
+                target = self.__queued__
+                self.__pending__ = []
+                self.__oldest__ = None
+                self.__flush_requested__ = False
+                self.__durable_requested__ = False
+            # end with
+
+            try:
+                self.__write__(rows, durable)
+                failures = {}
+                attempts = 0
+            except sqlite3.OperationalError as e:
+                attempts = attempts + 1
+                if __is_busy__(e) and attempts <= self.max_retries:
+                    # keep the rows, in order, ahead of anything newer
+                    self.retries = self.retries + 1
+                    with self.__condition__:
+                        if len(rows) > 0:
+                            self.__pending__ = rows + self.__pending__
+                            self.__oldest__ = time.monotonic() - self.max_delay
+                        self.__flush_requested__ = True
+                        self.__durable_requested__ = self.__durable_requested__ or durable
+                        self.__condition__.wait(min(0.05 * 2 ** attempts, 2.0))
+                    continue
+                failures = self.__write_rows__(rows, durable)
+                attempts = 0
+            except Exception:
+                failures = self.__write_rows__(rows, durable)
+                attempts = 0
+
+            with self.__condition__:
+                for owner, error in failures.items():
+                    self.__failures__.setdefault(owner, error)
+                self.__written__ = target
+                if durable:
+                    self.__synced__ = target
+                self.__condition__.notify_all()
+
+    def __write_rows__(self, rows, durable):
+        # writes a failed batch one row per transaction so only the
+        # rows that fail on their own are lost; returns
+        # {thread ident: error} for the threads that lost rows
+        failures = {}
+        for row in rows:
+            try:
+                self.__write__([row], durable)
+            except Exception as e:
+                print("WriteBehindQueue: dropped row %s: %s" % (row[0], e))
+                self.failed_rows = self.failed_rows + 1
+                failures.setdefault(row[2], e)
+        # end for
+        return failures
+
+    def __write__(self, rows, durable):
+        if len(rows) == 0:
+            # a barrier with nothing queued still has to sync the
+            # batches committed before it; an empty transaction
+            # writes nothing, a checkpoint syncs the log first
+            if durable:
+                self.connections.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                self.durable_batches = self.durable_batches + 1
+            return
+
+        with self.connections.transaction(durable=durable) as con:
+            # runs of the same statement go through executemany
+            start = 0
+            while start < len(rows):
+                statement = rows[start][0]
+                end = start + 1
+                while end < len(rows) and rows[end][0] == statement:
+                    end = end + 1
+                con.executemany(statement, [row[1] for row in rows[start:end]])
+                start = end
+            # end while
+
+        self.batches = self.batches + 1
+        self.rows = self.rows + len(rows)
+        if durable:
+            self.durable_batches = self.durable_batches + 1
+
+def __is_busy__(error):
+    # errors worth retrying: another connection holds the lock
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+# Schema migrations. MIGRATIONS[n] moves a database from
+# user_version n to n + 1; migrate() applies the missing ones in
+# a single transaction at startup. Append new migrations to the
+# list, never edit one that has shipped.
+#
+# Timestamps are unix time (time.time()); completed_meds is keyed
+# on the local date as 'YYYY-MM-DD'.
+
+def __table_exists__(con, name):
+    row = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+def __legacy_time__(column):
+    # the first schema stored str(datetime) in local time
+    return "(julianday(%s, 'utc') - 2440587.5) * 86400.0" % column
+
+def __migration_1__(con):
+    # keys and indexes. Tables left by the first version (created
+    # without keys) are renamed, copied over and dropped.
+    for table in ('wifi', 'schedule', 'completed_meds', 'events'):
+        if __table_exists__(con, table):
+            con.execute("ALTER TABLE %s RENAME TO %s_v0" % (table, table))
+    # end for
+
+    con.execute("CREATE TABLE wifi (id INTEGER PRIMARY KEY, timestamp REAL NOT NULL, ssid TEXT, passphrase TEXT)")
+    con.execute("CREATE INDEX wifi_timestamp ON wifi (timestamp)")
+
+    con.execute("CREATE TABLE schedule (id INTEGER PRIMARY KEY, timestamp REAL NOT NULL, " \
+        "liquid1_time REAL, liquid2_time REAL, pill1_time REAL, pill2_time REAL)")
+    con.execute("CREATE INDEX schedule_timestamp ON schedule (timestamp)")
+
+    con.execute("CREATE TABLE completed_meds (date TEXT PRIMARY KEY, " \
+        "pill1 REAL, pill2 REAL, liquid1 REAL, liquid2 REAL) WITHOUT ROWID")
+
+    con.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, timestamp REAL NOT NULL, " \
+        "source TEXT, name TEXT, value REAL)")
+    con.execute("CREATE INDEX events_timestamp ON events (timestamp)")
+    con.execute("CREATE INDEX events_source_name ON events (source, name, timestamp)")
+
+    if __table_exists__(con, 'wifi_v0'):
+        con.execute("INSERT INTO wifi (timestamp, ssid, passphrase) " \
+            "SELECT %s, ssid, passphrase FROM wifi_v0 ORDER BY timestamp" % __legacy_time__('timestamp'))
+        con.execute("DROP TABLE wifi_v0")
+    if __table_exists__(con, 'schedule_v0'):
+        con.execute("INSERT INTO schedule (timestamp, liquid1_time, liquid2_time, pill1_time, pill2_time) " \
+            "SELECT %s, liquid1_time, liquid2_time, pill1_time, pill2_time FROM schedule_v0 " \
+            "ORDER BY timestamp" % __legacy_time__('timestamp'))
+        con.execute("DROP TABLE schedule_v0")
+    if __table_exists__(con, 'completed_meds_v0'):
+        con.execute("INSERT OR IGNORE INTO completed_meds (date, pill1, pill2, liquid1, liquid2) " \
+            "SELECT date(date), %s, %s, %s, %s FROM completed_meds_v0" % (__legacy_time__('pill1'), \
+            __legacy_time__('pill2'), __legacy_time__('liquid1'), __legacy_time__('liquid2')))
+        con.execute("DROP TABLE completed_meds_v0")
+    if __table_exists__(con, 'events_v0'):
+        con.execute("INSERT INTO events (timestamp, source, name, value) " \
+            "SELECT %s, source, name, value FROM events_v0 ORDER BY timestamp" % __legacy_time__('timestamp'))
+        con.execute("DROP TABLE events_v0")
+
+MIGRATIONS = [
+    __migration_1__,
+]
+
+def schema_version(connection_manager=None):
+    if connection_manager is None:
+        connection_manager = get_connection_manager()
+    return connection_manager.execute("PRAGMA user_version")[0][0]
+
+def migrate(connection_manager=None):
+    # brings the database up to len(MIGRATIONS); returns the
+    # number of migrations applied
+    if connection_manager is None:
+        connection_manager = get_connection_manager()
+
+    with connection_manager.transaction() as con:
+        version = con.execute("PRAGMA user_version").fetchone()[0]
+        if version > len(MIGRATIONS):
+            raise RuntimeError("Database schema version %s is newer than this software (%s)." % \
+                (version, len(MIGRATIONS)))
+        for index in range(version, len(MIGRATIONS)):
+            print("Migrating database to schema version %s..." % (index + 1))
+            MIGRATIONS[index](con)
+        # end for
+        con.execute("PRAGMA user_version = %d" % len(MIGRATIONS))
+    return len(MIGRATIONS) - version
+
 class BaseStatement(object):
     def __init__(self, statement, parameters=()):
         self.statement = statement
@@ -11,29 +461,66 @@ class BaseStatement(object):
 
 class BaseModel(object):
 
+    # None uses the process wide connection manager
+    connection_manager = None
+
+    # inserts go through this WriteBehindQueue when set
+    write_queue = None
+
+    # the tables themselves are created by MIGRATIONS
+
     # delegate functions
-    def get_create_statement(self) -> BaseStatement: pass
     def get_insert_statement(self) -> BaseStatement: pass
     def get_select_statement(self) -> BaseStatement: pass
 
-    def create(self):
-        s = self.get_create_statement()
-        return self.__execute__(s.statement, s.parameters)
-
-    def insert(self):
+    def insert(self, durable=False):
+        # with a write queue the row is buffered; durable waits
+        # until it (and everything before it) is on the card
         s = self.get_insert_statement()
-        return self.__execute__(s.statement, s.parameters)
+        return self.__write__(s.statement, s.parameters, durable)
     
     def select(self):
         s = self.get_select_statement()
         return self.__execute__(s.statement, s.parameters)
 
-    def __execute__(self, statement, parameters):
-        con = sqlite3.connect(DB_FILENAME)
-        c = con.cursor()
-        results = c.execute(statement).fetchall()
-        c.close()
-        return results
+    def get(self):
+        # the row from select(), or None
+        rows = self.select()
+        if len(rows) == 0:
+            return None
+        return rows[0]
+
+    @property
+    def connections(self):
+        if self.connection_manager is None:
+            return get_connection_manager()
+        return self.connection_manager
+
+    def transaction(self):
+        return self.connections.transaction()
+
+    def __execute__(self, statement, parameters=()):
+        # reads see the rows still waiting in the write queue, or
+        # taken by a batch that is not committed yet. Inside a
+        # transaction the writer thread could not get the lock this
+        # thread holds, so queued rows are not waited for there.
+        if self.write_queue is not None and not self.connections.in_transaction():
+            self.write_queue.flush()
+        return self.connections.execute(statement, parameters)
+
+    def __write__(self, statement, parameters=(), durable=False):
+        # inside a transaction rows are written directly, as part of
+        # it; the outermost transaction commits (and syncs) them
+        if self.write_queue is None or self.connections.in_transaction():
+            if durable:
+                with self.connections.transaction(durable=True):
+                    return self.__execute__(statement, parameters)
+            return self.__execute__(statement, parameters)
+
+        self.write_queue.put(statement, parameters)
+        if durable:
+            self.write_queue.barrier()
+        return []
 
 class WiFiModel(BaseModel):
 
@@ -42,14 +529,21 @@ class WiFiModel(BaseModel):
         self.ssid = None
         self.passphrase = None
 
-    def get_create_statement(self):
-        return BaseStatement("CREATE TABLE wifi (timestamp real, ssid text, passphrase text)")
-
     def get_insert_statement(self):
-        return BaseStatement("INSERT INTO wifi VALUES(?, ?, ?)", (datetime.now(), self.ssid, self.passphrase))
+        return BaseStatement("INSERT INTO wifi (timestamp, ssid, passphrase) VALUES(?, ?, ?)", \
+            (time.time(), self.ssid, self.passphrase))
 
     def get_select_statement(self):
-        return BaseStatement("SELECT TOP(1) FROM wifi ORDER BY timestamp DESC")
+        # latest row, read backwards off the timestamp index
+        return BaseStatement("SELECT timestamp, ssid, passphrase FROM wifi ORDER BY timestamp DESC LIMIT 1")
+
+    def load(self):
+        # loads the latest settings; False if there are none
+        row = self.get()
+        if row is None:
+            return False
+        self.timestamp, self.ssid, self.passphrase = row
+        return True
 
     @property
     def objects(self):
@@ -58,72 +552,185 @@ class WiFiModel(BaseModel):
 class ScheduleModel(BaseModel):
     
     def __init__(self):
+        self.timestamp = None
         self.liquid1_time = None
         self.liquid2_time = None
         self.pill1_time = None
         self.pill2_time = None
 
-    def get_create_statement(self):
-        return BaseStatement("CREATE TABLE schedule (timestamp real, liquid1_time real, liquid2_time real, pill1_time real, pill2_time real)")
-
     def get_insert_statement(self):
-        return BaseStatement("INSERT INTO schedule VALUES(?, ?, ?, ?, ?)", (datetime.now(), self.liquid1_time, \
+        return BaseStatement("INSERT INTO schedule (timestamp, liquid1_time, liquid2_time, pill1_time, pill2_time) " \
+            "VALUES(?, ?, ?, ?, ?)", (time.time(), self.liquid1_time, \
             self.liquid2_time, self.pill1_time, self.pill2_time))
 
     def get_select_statement(self):
-        return BaseStatement("SELECT TOP(1) FROM schedule ORDER BY timestamp DESC")
+        # latest row, read backwards off the timestamp index
+        return BaseStatement("SELECT timestamp, liquid1_time, liquid2_time, pill1_time, pill2_time " \
+            "FROM schedule ORDER BY timestamp DESC LIMIT 1")
+
+    def load(self):
+        # loads the latest schedule; False if there is none
+        row = self.get()
+        if row is None:
+            return False
+        self.timestamp, self.liquid1_time, self.liquid2_time, self.pill1_time, self.pill2_time = row
+        return True
 
     @property
     def objects(self):
         return self.__execute__("SELECT * FROM schedule")
 
 class CompletedMedsModel(BaseModel):
+
+    # medications with a column in completed_meds
+    MEDICATIONS = ('pill1', 'pill2', 'liquid1', 'liquid2')
+
     def __init__(self):
+        self.date = None
         self.pill1 = None
         self.pill2 = None
         self.liquid1 = None
         self.liquid2 = None
 
-    def get_create_statement(self):
-        return BaseStatement("CREATE TABLE completed_meds (date real, pill1 real, pill2 real, liquid1 real, liquid2 real)")
-
     def get_insert_statement(self):
-        return BaseStatement("INSERT INTO completed_meds VALUES(?, ?, ?, ?, ?)", (datetime.today(), \
+        return BaseStatement("INSERT OR REPLACE INTO completed_meds (date, pill1, pill2, liquid1, liquid2) " \
+            "VALUES(?, ?, ?, ?, ?)", (self.date or date.today().isoformat(), \
             self.pill1, self.pill2, self.liquid1, self.liquid2))
 
-    def med_completed(self, medication):
-        # get the current dates record, create it
-        # if it does not exist
-        todays = self.get_todays()
-        if todays is None:
-            todays = self.create_todays()
-
-        # mark the medication complete and save
-        # the record
-        if medication == 'pill1':
-            self.pill1 = datetime.now()
-        if medication == 'pill2':
-            self.pill2 = datetime.now()
-        if medication == 'liquid1':
-            self.liquid1 = datetime.now()
-        if medication == 'liquid2':
-            self.liquid2 = datetime.now()
+    def get_select_statement(self):
+        return BaseStatement("SELECT date, pill1, pill2, liquid1, liquid2 FROM completed_meds " \
+            "ORDER BY date DESC LIMIT 1")
+
+    def get_day(self, day):
+        # the record for a date (or 'YYYY-MM-DD'), or None. One
+        # primary key seek.
+        if isinstance(day, date):
+            day = day.isoformat()
+        rows = self.__execute__("SELECT date, pill1, pill2, liquid1, liquid2 FROM completed_meds " \
+            "WHERE date = ?", (day,))
+        if len(rows) == 0:
+            return None
+        self.date, self.pill1, self.pill2, self.liquid1, self.liquid2 = rows[0]
+        return rows[0]
+
+    def get_days(self, first, last):
+        # records from first to last inclusive, oldest first
+        if isinstance(first, date):
+            first = first.isoformat()
+        if isinstance(last, date):
+            last = last.isoformat()
+        return self.__execute__("SELECT date, pill1, pill2, liquid1, liquid2 FROM completed_meds " \
+            "WHERE date BETWEEN ? AND ? ORDER BY date", (first, last))
+
+    def get_todays(self):
+        return self.get_day(date.today())
+
+    def create_todays(self):
+        self.__write__("INSERT OR IGNORE INTO completed_meds (date) VALUES(?)", (date.today().isoformat(),))
+        return self.get_todays()
+
+    def med_completed(self, medication, durable=True):
+        # marks the medication complete in today's record, creating
+        # the record if it does not exist, in one upsert. A confirmed
+        # dose is written durably by default.
+        if medication not in self.MEDICATIONS:
+            raise ValueError("Unknown medication %s." % medication)
+
+        today = date.today().isoformat()
+        completed = time.time()
+
+        # written directly rather than behind the queue so the row
+        # count can be checked; queued rows go first to keep order
+        if self.write_queue is not None and not self.connections.in_transaction():
+            self.write_queue.flush()
+        with self.connections.transaction(durable=durable) as con:
+            cursor = con.execute("INSERT INTO completed_meds (date, %s) VALUES(?, ?) " \
+                "ON CONFLICT(date) DO UPDATE SET %s = excluded.%s" % (medication, medication, medication), \
+                (today, completed))
+            if cursor.rowcount != 1:
+                raise RuntimeError("Recording %s for %s changed %s rows." % (medication, today, cursor.rowcount))
+
+        self.date = today
+        setattr(self, medication, completed)
 
     @property
     def objects(self):
         return self.__execute__("SELECT * FROM completed_meds")
 
-class ModelManager(object):
+class EventModel(BaseModel):
+    # time stamped records from the devices and the state machine:
+    # deliveries, sensor snapshots, state changes
 
     def __init__(self):
+        self.source = None
+        self.name = None
+        self.value = None
+
+    def get_insert_statement(self):
+        return BaseStatement("INSERT INTO events (timestamp, source, name, value) VALUES(?, ?, ?, ?)", \
+            (time.time(), self.source, self.name, self.value))
+
+    def get_select_statement(self):
+        return BaseStatement("SELECT timestamp, source, name, value FROM events ORDER BY timestamp DESC LIMIT 1")
+
+    def record(self, source, name, value=None, durable=False):
+        self.source = source
+        self.name = name
+        self.value = value
+        return self.insert(durable=durable)
+
+    def between(self, start, end, source=None, name=None):
+        # events with start <= timestamp < end, oldest first, for
+        # the given source and/or name. With a source this is a range
+        # scan on the (source, name, timestamp) index, otherwise on
+        # the timestamp index.
+        filters = []
+        parameters = []
+        if source is not None:
+            filters.append("source = ?")
+            parameters.append(source)
+        if name is not None:
+            filters.append("name = ?")
+            parameters.append(name)
+        filters.append("timestamp >= ? AND timestamp < ?")
+        parameters.extend((start, end))
+        return self.__execute__("SELECT timestamp, source, name, value FROM events " \
+            "WHERE %s ORDER BY timestamp" % " AND ".join(filters), tuple(parameters))
+
+    @property
+    def objects(self):
+        return self.__execute__("SELECT * FROM events")
+
+class ModelManager(object):
+
+    def __init__(self, write_behind=True):
 
         self.wifi = WiFiModel()
         self.schedule = ScheduleModel()
         self.completed_meds = CompletedMedsModel()
+        self.events = EventModel()
+
+        # creates or upgrades the tables
+        migrate()
+
+        # the high volume models write behind; settings
+        # are rare and go straight to the database
+        self.write_queue = None
+        if write_behind:
+            self.write_queue = WriteBehindQueue()
+            self.completed_meds.write_queue = self.write_queue
+            self.events.write_queue = self.write_queue
+
+    def barrier(self, timeout=None):
+        # blocks until every queued record is on the card
+        if self.write_queue is None:
+            return True
+        return self.write_queue.barrier(timeout)
 
-        self.wifi.create()
-        self.schedule.create()
-        self.completed_meds.create()
+    def close(self):
+        if self.write_queue is not None:
+            self.write_queue.stop()
+        get_connection_manager().close_all()
 
 if __name__ == '__main__':
 
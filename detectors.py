@@ -0,0 +1,123 @@
+import time
+
+
+class WeightEventDetector(object):
+    # Turns a stream of (timestamp, weight) samples into events:
+    #
+    #   'stable'    - the weight has stayed inside stable_band for
+    #                 stable_time seconds
+    #   'step'      - a new stable weight differs from the previous
+    #                 stable weight by at least step_threshold
+    #   'cup_on'    - a stable weight at or above on_threshold
+    #   'cup_clear' - a stable weight at or below off_threshold
+    #
+    # on_threshold > off_threshold gives the cup presence hysteresis.
+    # Listeners are called as callback(event, timestamp, weight).
+    #
+    # Detection latency is the time between the first sample past
+    # a threshold and the sample that fires the event. It is bounded
+    # by stable_time plus one sample period, and is recorded per
+    # event in self.latency.
+
+    def __init__(self, on_threshold=50.0, off_threshold=20.0, stable_band=2.0, stable_time=0.3, step_threshold=5.0):
+        if off_threshold >= on_threshold:
+            raise ValueError("off_threshold must be below on_threshold.")
+
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.stable_band = stable_band
+        self.stable_time = stable_time
+        self.step_threshold = step_threshold
+
+        self.listeners = []
+        self.latency = {}
+        self.reset()
+
+    def reset(self, present=False):
+        self.present = present
+        self.stable = False
+        self.stable_weight = None
+
+        # anchor of the current stability run
+        self.__anchor__ = None
+        self.__anchor_time__ = 0.0
+        self.__run_sum__ = 0.0
+        self.__run_count__ = 0
+
+        # first sample past the threshold we are waiting on
+        self.__crossed_time__ = None
+
+    def add_listener(self, callback, event=None):
+        # event None listens to every event
+        self.listeners.append((event, callback))
+
+    def bind_fsm(self, fsm):
+        # posts the cup_on / cup_clear triggers to a PillDispenser's
+        # event queue; it drops them in states where they are not valid
+        def fire(event, timestamp, weight):
+            fsm.post(event)
+        self.add_listener(fire, 'cup_on')
+        self.add_listener(fire, 'cup_clear')
+
+    def update(self, timestamp, weight):
+
+        # start the latency clock on the first sample past
+        # the threshold for the next presence change
+        if self.present:
+            crossed = weight <= self.off_threshold
+        else:
+            crossed = weight >= self.on_threshold
+        if not crossed:
+            self.__crossed_time__ = None
+        elif self.__crossed_time__ is None:
+            self.__crossed_time__ = timestamp
+
+        # leaving the band restarts the stability run
+        if self.__anchor__ is None or abs(weight - self.__anchor__) > self.stable_band:
+            self.__anchor__ = weight
+            self.__anchor_time__ = timestamp
+            self.__run_sum__ = 0.0
+            self.__run_count__ = 0
+            self.stable = False
+
+        self.__run_sum__ = self.__run_sum__ + weight
+        self.__run_count__ = self.__run_count__ + 1
+
+        if self.stable or timestamp - self.__anchor_time__ < self.stable_time:
+            return
+
+        # the weight just settled
+        self.stable = True
+        previous = self.stable_weight
+        self.stable_weight = self.__run_sum__ / self.__run_count__
+        self.__fire__('stable', timestamp)
+
+        if previous is not None and abs(self.stable_weight - previous) >= self.step_threshold:
+            self.__fire__('step', timestamp)
+
+        if not self.present and self.stable_weight >= self.on_threshold:
+            self.present = True
+            self.__fire_presence__('cup_on', timestamp)
+        elif self.present and self.stable_weight <= self.off_threshold:
+            self.present = False
+            self.__fire_presence__('cup_clear', timestamp)
+
+    def __fire_presence__(self, event, timestamp):
+        if self.__crossed_time__ is not None:
+            self.latency[event] = timestamp - self.__crossed_time__
+        self.__crossed_time__ = None
+        self.__fire__(event, timestamp)
+
+    def __fire__(self, event, timestamp):
+        for listen_event, callback in self.listeners:
+            if listen_event is None or listen_event == event:
+                callback(event, timestamp, self.stable_weight)
+
+    def feed(self, samples):
+        # convenience for a batch of (timestamp, weight) pairs
+        for timestamp, weight in samples:
+            self.update(timestamp, weight)
+
+    def poll(self, weight):
+        # for callers without sample timestamps
+        self.update(time.monotonic(), weight)
@@ -1,16 +1,27 @@
 import time
-import RPi.GPIO
+import numpy as np
+import RPi.GPIO as GPIO
 
 # i2c load cell using adafruit adc
 # https://www.adafruit.com/product/4538
 from cedargrove_nau7802 import NAU7802
+from acquisition import LoadCellSampler
+from motion import MotionPlanner
+from i2cbus import get_bus_manager, PRIORITY_HIGH, PRIORITY_LOW
+from pca_shadow import ShadowPWM
 
 # adafruit motor kit library
-import board
 from adafruit_motorkit import MotorKit
 from adafruit_motor import stepper
 
 class BaseDevice(object):
+
+    # how often the runtime calls loop() (Hz), and how long after
+    # being due a loop() may finish (seconds, None for one period).
+    # See runtime.DeviceRuntime.
+    loop_rate = 10.0
+    loop_deadline = None
+
     def __init__(self, name, address):
         self.address = address
         self.name = name
@@ -18,8 +29,13 @@ class BaseDevice(object):
     def setup(self):
         print("setting up: %s" % self.name)
     def loop(self):pass
+    def teardown(self):pass
 
 class LimitSwitch(object):
+
+    loop_rate = 50.0
+    loop_deadline = None
+
     def __init__(gpio_pin=22):
         self.gpio_pin = gpio_pin
         self.state = False
@@ -44,56 +60,280 @@ class LimitSwitch(object):
 # Load cell for reading cup / pill weight
 class LoadCell(BaseDevice):
 
-    def __init__(self, name="Load Cell", address=0x2a):
+    def __init__(self, name="Load Cell", address=0x2a, drdy_pin=None, timeout=1.0,
+                 conversion_rate=10, settle_samples=0, blocking=True, bus=None, shadow=False):
         super(LoadCell, self).__init__(name, address)
-        self.device = NAU7802(board.I2C(), address=self.address, active_channels=2)
+
+        # ADC polling gives way to motor traffic on the shared bus
+        if bus is None:
+            bus = get_bus_manager()
+        self.bus = bus.client(self.name, PRIORITY_LOW)
+
+        # with blocking=False the ADC powers up (and calibrates) in steps
+        # driven by ready / loop() instead of sleeping in here
+        self.device = NAU7802(self.bus, address=self.address, active_channels=2,
+                              conversion_rate=conversion_rate, settle_samples=settle_samples,
+                              blocking=blocking, shadow=shadow)
         self.value = 0.0
+        self.__zeroed__ = False
+
+        # optional GPIO (BCM numbering) wired to the NAU7802 DRDY output.
+        # Without it, samples are waited for with a rate-aware timed poll.
+        self.drdy_pin = drdy_pin
+        self.timeout = timeout
+        if self.drdy_pin is not None:
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.drdy_pin, GPIO.IN)
+
+        # background sampler, see start_sampling()
+        self.sampler = None
+        self.__consumed__ = {}
+
+        # optional streaming filter per channel, see set_filter()
+        self.filters = {}
+
+        # raw value at zero weight and raw counts per gram, per channel.
+        # The offsets are measured by zero_scale().
+        self.offsets = {1: 0.0, 2: 0.0}
+        self.counts_per_gram = {1: 1.0, 2: 1.0}
+        self.weight = 0.0
+
+        # event detectors fed with every channel 1 weight, see add_detector()
+        self.detectors = []
+
+        # time series stores fed with every channel 1 weight, see add_recorder()
+        self.recorders = []
+
+    @property
+    def ready(self):
+        # True once the ADC has finished powering up. Each check
+        # advances a non-blocking power-up by one step.
+        return self.device.ready
 
     def setup(self):
         super(LoadCell, self).setup()
-        self.zero_scale()
+
+        # zeroing waits for the ADC, so defer it to loop()
+        # while a non-blocking power-up is still running
+        if self.ready:
+            self.zero_scale()
     
+    def teardown(self):
+        # stops the sampler and writes out the recorders, including
+        # their open rollup buckets
+        self.stop_sampling()
+        for series in self.recorders:
+            series.close()
+        # end for
+
+    def wait_for_sample(self, timeout=None):
+        # blocks until a conversion is ready to be read. Returns
+        # False if nothing arrived within the timeout (seconds).
+        if timeout is None:
+            timeout = self.timeout
+
+        if self.drdy_pin is None:
+            return self.device.wait_for_data(timeout)
+
+        # DRDY stays high until the conversion is read, so only wait
+        # for an edge while it is low. The edge wait is sliced to a couple
+        # of conversion periods in case the edge lands before we arm it.
+        deadline = time.monotonic() + timeout
+        slice_ms = max(1, int(self.device.conversion_period * 2000))
+        while not GPIO.input(self.drdy_pin):
+            if time.monotonic() >= deadline:
+                return False
+            GPIO.wait_for_edge(self.drdy_pin, GPIO.RISING, timeout=slice_ms)
+        return True
+
+    def start_sampling(self, channels=(1,), size=256, dwell=10):
+        # hands the NAU7802 over to a background thread that keeps
+        # a ring buffer of timestamped samples per channel
+        if self.sampler is None:
+            self.sampler = LoadCellSampler(self, channels=channels, size=size, dwell=dwell)
+            self.__consumed__ = {}
+        self.sampler.start()
+
+    def stop_sampling(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
+
+    def isSampling(self):
+        return self.sampler is not None and self.sampler.isRunning()
+
+    def latest(self, channel=1):
+        # (timestamp, value) of the newest background sample, or None
+        if self.sampler is None:
+            return None
+        return self.sampler.latest(channel)
+
+    def window(self, channel=1, samples=None):
+        # (times, values) of the newest background samples, oldest first
+        if self.sampler is None:
+            return [], []
+        return self.sampler.window(channel, samples)
+
+    def set_filter(self, channel, value_filter):
+        # value_filter is any filter from filters.py (or a FilterChain)
+        # that every new value for the channel is passed through
+        self.filters[channel] = value_filter
+
+    def filter_value(self, channel, value):
+        value_filter = self.filters.get(channel)
+        if value_filter is None:
+            return value
+        return value_filter.update(value)
+
+    def to_weight(self, channel, value):
+        # converts a raw (filtered) value to grams
+        return (value - self.offsets[channel]) / self.counts_per_gram[channel]
+
+    def add_detector(self, detector):
+        # detector is a detectors.WeightEventDetector (or anything
+        # with update(timestamp, weight))
+        self.detectors.append(detector)
+
+    def add_recorder(self, series):
+        # series is a timeseries.TimeSeries; it keeps the weight
+        # history (raw samples plus 1 s / 1 min rollups)
+        self.recorders.append(series)
+
+    def __consume__(self, channel):
+        # runs every background sample that arrived since the last call
+        # through the channel's filter in one batch
+        buffer = self.sampler.buffers[channel]
+        count = buffer.count
+        new = min(count - self.__consumed__.get(channel, 0), buffer.size)
+        self.__consumed__[channel] = count
+        if new <= 0:
+            return [], []
+
+        times, values = buffer.window(new)
+        value_filter = self.filters.get(channel)
+        if value_filter is not None:
+            values = value_filter.process(values)
+        return times, values
+
     def read_raw_value(self, channel=1, samples=100):
-        count = 0
-        sample_sum = 0
-        
-        if channel == 1:
-            self.device.channel = 1
-        elif channel == 2:
-            self.device.channel = 2
-        else:
+        if channel not in (1, 2):
             print("Channel requested: %s" % channel)
             raise ValueError("Invalid channel number.")
 
-        while count <= samples:
-            if self.device.available:
-                sample_sum = sample_sum + self.device.read()
-                count = count + 1
-            # end if
+        if not self.isSampling():
+            return self.__read_direct__(channel, samples)
+
+        # while the sampler owns the device, average its buffer instead
+        if channel in self.sampler.channels:
+            times, values = self.window(channel, samples)
+            if len(values) >= samples:
+                return int(sum(values) / len(values))
+
+        # the sampler does not read this channel (or has not buffered
+        # enough yet): pause it for a direct read. Its buffers and
+        # sample counts carry on when it restarts.
+        self.sampler.stop()
+        try:
+            return self.__read_direct__(channel, samples)
+        finally:
+            self.sampler.start()
+
+    def __read_direct__(self, channel, samples):
+        count = 0
+        sample_sum = 0
+
+        # only pay the multiplexer settling time on an actual switch
+        if self.device.channel != channel:
+            self.device.channel = channel
+
+        while count < samples:
+            if not self.wait_for_sample():
+                raise RuntimeError("Load cell conversion timed out")
+            sample_sum = sample_sum + self.device.read()
+            count = count + 1
         # end loop
         return int(sample_sum / samples)
 
     def zero_scale(self):
+        self.__zeroed__ = True
 
-        self.device.channel = 1
-        self.read_raw_value(channel=1, samples=100)
-        self.device.channel = 2
-        self.read_raw_value(channel=2, samples=100)
+        self.offsets[1] = self.read_raw_value(channel=1, samples=100)
+        self.offsets[2] = self.read_raw_value(channel=2, samples=100)
 
     def loop(self):
-        
+
+        # nothing to read until the ADC is powered up
+        if not self.ready:
+            return
+
+        # zero on the first ready check, whether or not the
+        # background sampler is running
+        if not self.__zeroed__:
+            self.zero_scale()
+
         # read and update the value
-        self.value = self.read_raw_value(channel=1, samples=1)
-        print("self.value= %s" % self.value)
+        if self.isSampling():
+            times, values = self.__consume__(channel=1)
+        else:
+            value = self.filter_value(1, self.read_raw_value(channel=1, samples=1))
+            times, values = [time.monotonic()], [value]
+
+        if len(values) == 0:
+            return
+
+        self.value = float(values[-1])
+        self.weight = self.to_weight(1, self.value)
+
+        if len(self.recorders) > 0:
+            weights = self.to_weight(1, np.asarray(values, dtype=np.float64))
+            for series in self.recorders:
+                series.append(times, weights, monotonic=True)
+        # end if
+
+        # every sample goes to the detectors so events
+        # are timed from the sample that caused them
+        for detector in self.detectors:
+            for timestamp, value in zip(times, values):
+                detector.update(timestamp, self.to_weight(1, value))
 
 class MotorControl(BaseDevice):
-    
-    def __init__(self, name="Motor Control Board", address=0x60):
+
+    # pending PWM writes are flushed on every loop()
+    loop_rate = 50.0
+
+    def __init__(self, name="Motor Control Board", address=0x60, bus=None):
         super(MotorControl, self).__init__(name, address)
-        self.kit = MotorKit(self.address, i2c=board.I2C())
+
+        # stepper and motor writes go first on the shared bus
+        if bus is None:
+            bus = get_bus_manager()
+        self.bus = bus.client(self.name, PRIORITY_HIGH)
+        self.kit = MotorKit(self.address, i2c=self.bus)
+
+        # MotorKit builds its motors lazily from _pca.channels, so swapping
+        # in the shadow layer here routes every motor and stepper write
+        # through it. Writes reach the board on flush().
+        self.pwm = ShadowPWM(self.kit._pca)
+        self.kit._pca.channels = self.pwm
+
+    def flush(self):
+        # sends all changed PWM channels, one block write per run
+        return self.pwm.flush()
+
+    def stats(self):
+        return self.pwm.stats()
+
+    def loop(self):
+        self.flush()
 
 class PillWheel(object):
-    def __init__(self, motor_control_class, motor_number=1, steps_per_rev=200):
+
+    # moves run on their own timing thread, loop() has nothing to do
+    loop_rate = 1.0
+    loop_deadline = None
+
+    def __init__(self, motor_control_class, motor_number=1, steps_per_rev=200, microsteps=16,
+                 pockets=None, max_speed=0.25, acceleration=0.5):
 
         self.control = motor_control_class
         if motor_number == 1:
@@ -102,89 +342,98 @@ class PillWheel(object):
             self.device = self.control.kit.stepper2
         else:
             raise ValueError("Invalid motor number.")
+        self.control.flush()
 
         self.direction = stepper.FORWARD # set the initial direction to forward
         self.steps_per_rev = steps_per_rev
-        
+        self.microsteps = microsteps
+        self.pockets = pockets
+
+        # moves run on their own timing thread. max_speed is in
+        # revolutions per second, acceleration in revolutions/s^2.
+        microsteps_per_rev = self.steps_per_rev * self.microsteps
+        self.planner = MotionPlanner(self.__step__, max_speed=max_speed * microsteps_per_rev,
+                                     acceleration=acceleration * microsteps_per_rev)
+
         # private variables
-        self.__step_count__ = 0
-        self.__count_total__ = 0
-        self.__moving__ = False
         self.__motor_number__ = motor_number
+        self.name = "%s Stepper %s" % (self.control.name, motor_number)
 
     def isMoving(self):
-        return self.__moving__
+        return self.planner.isMoving()
 
     def setup(self):
         # releases power to the stepper motor
         print("setting up: Motor-%s" % self.__motor_number__)
         self.device.release()
+        self.control.flush()
         self.direction = stepper.FORWARD
 
+    def add_listener(self, callback):
+        # callback(event, steps_done, steps_total) with event
+        # 'progress' or 'complete', called from the timing thread
+        self.planner.add_listener(callback)
+
     def move(self, revolutions):
         # revolutions can be positive, negative, or a fraction
-        # of 
+        # of a revolution. Returns False if a move is already running.
+        if self.isMoving():
+            return False
 
-        # calculates the number of steps to move
-        steps = self.revolutions / self.steps_per_rev
+        # calculates the number of microsteps to move
+        steps = int(round(revolutions * self.steps_per_rev * self.microsteps))
 
         # if the steps are negative set the direction to backward
         if steps < 0:
-            direction = stepper.BACKWARD
+            self.direction = stepper.BACKWARD
             steps = steps * -1 # turn steps back to positive
         else:
-            direction = stepper.FORWARD
+            self.direction = stepper.FORWARD
         # end if
 
-        # actually move the motor
-        for i in range(steps):
-            self.device.onestep(style=stepper.MICROSTEP)
+        self.planner.start(steps, self.direction)
+        return True
 
-    def move(self, revolutions):
+    def index(self, pockets=1):
+        # moves the wheel by a number of pockets
+        if self.pockets is None:
+            raise ValueError("Pocket count not configured.")
+        return self.move(pockets / self.pockets)
 
-        if not self.isMoving():
-            step_total = revolutions / self.steps_per_rev
-            
-            if step_total < 1:
-                self.direction = stepper.BACKWARD
-            else:
-                self.direction = stepper.FORWARD
-            # end if
-            
-            self.__count_total__ = abs(step_total)
-            self.__moving__ = True
+    def wait(self, timeout=None):
+        return self.planner.wait(timeout)
+
+    def stop(self):
+        self.planner.stop()
+
+    def __step__(self, direction):
+        self.device.onestep(direction=direction, style=stepper.MICROSTEP)
 
-    def __move_complete__(self):
-        self.__step_count__ = 0
-        self.__count_total__ = 0
-        self.__moving__ = False
+        # the coil updates of one step go out as a single block write
+        self.control.flush()
 
     def status(self):
         status =  {
-            "Motor":"Motor" + self.__motor_number__,
+            "Motor":"Motor%s" % self.__motor_number__,
             "isMoving":self.isMoving(),
+            "progress":self.planner.progress,
+            "lateSteps":self.planner.late_steps,
         }
         print(status)
         return status
 
     def loop(self):
-
-        if self.isMoving() and self.__step_count__ < self.__count_total__:
-            self.device.onestep(direction=self.direction, style=stepper.MICROSTEP)
-            self.__step_count__ = self.__step_count__ + 1
-
-        elif self.isMoving() and self.__step_count__ == self.__count_total__:
-            self.device.onestep(direction=self.direction, style=stepper.MICROSTEP)
-            self.__move_complete__()
-
-        else:
-            pass # nothing to do
-        # end if
+        pass # moves run on the planner's timing thread
 
 
 class Pump(object):
 
-    def __init__(self, motor_control_class, motor_number=1, throttle=0.75, dribble=0.25):
+    # the closed loop dosing cut-off is decided in loop()
+    loop_rate = 50.0
+    loop_deadline = 0.010
+
+    def __init__(self, motor_control_class, motor_number=1, throttle=0.75, dribble=0.25,
+                 load_cell=None, density=1.0):
         
         # sets the control object to the given motor
         # control class
@@ -202,10 +451,29 @@ class Pump(object):
             self.device = self.control.kit.motor4
         else:
             raise ValueError("Invalid motor number")
+        self.control.flush()
 
+        self.name = "%s Pump %s" % (self.control.name, motor_number)
         self.throttle = throttle
         self.dribble = dribble
 
+        # with a load cell the dose is cut off on measured weight
+        # (closed loop), otherwise on time (open loop). density is
+        # in grams per mL.
+        self.load_cell = load_cell
+        self.density = density
+
+        # seconds between the pump changing speed and the scale seeing
+        # it (liquid in the tubing plus filter lag). Used to predict how
+        # much is still in flight when the pump is slowed or stopped.
+        self.response_time = 0.5
+
+        # seconds to let the scale settle before measuring the result
+        self.settle_time = 2.0
+
+        # report of the last delivery, see __finish__()
+        self.last_delivery = None
+
         self.__liquid_total__ = 0.0
         self.__liquid_count__ = 0.0
         self.__liquid_preact__ = 1.0
@@ -217,10 +485,19 @@ class Pump(object):
         self.__dribble_time__ = 0
         self.__total_deliver_time__ = 0
 
+        # closed loop state
+        self.__phase__ = None
+        self.__start_weight__ = 0.0
+        self.__last_weight__ = 0.0
+        self.__last_time__ = 0.0
+        self.__flow_rate__ = 0.0
+        self.__stop_time__ = 0.0
+
     def setup(self, fast_rate_sec_to_ml=20, dribbe_rate_sec_to_mL=300):
 
         # to start, make the throttle zero
         self.device.throttle = 0.0
+        self.control.flush()
 
         self.__full_rate_sec_per_mL__ = fast_rate_sec_to_ml
         self.__dribble_sec_per_mL__ = dribbe_rate_sec_to_mL
@@ -230,53 +507,133 @@ class Pump(object):
 
     def deliver_liquid(self, mL):
 
-        # calculate how many seconds (milliseconds)
-        # to run the pump at full speed, and how many
-        # seconds to run the pump at dribble speed
-        if not self.isRunning():
-            self.__liquid_total__ = mL
-            
-            full_rate_liquid = self.__liquid_total__ - self.__liquid_preact__
-            
-            # full rate time in milliseconds
-            self.__full_rate_time__ = (self.__full_rate_sec_per_mL__ / full_rate_liquid) * 1000
+        if self.isRunning():
+            return
+
+        self.__liquid_total__ = mL
+        self.__liquid_count__ = 0.0
+
+        # dribble the last preact mL (or all of it on a tiny dose)
+        preact = min(self.__liquid_preact__, self.__liquid_total__)
+        full_rate_liquid = self.__liquid_total__ - preact
+
+        # full rate and dribble times in seconds. In closed loop these
+        # only bound how long the delivery may take.
+        self.__full_rate_time__ = self.__full_rate_sec_per_mL__ * full_rate_liquid
+        self.__dribble_time__ = self.__dribble_sec_per_mL__ * preact
+        self.__total_deliver_time__ = self.__full_rate_time__ + self.__dribble_time__
 
-            # dribble time in milliseconds
-            self.__dribble_time__ = (self.__dribble_sec_per_mL__ / self.__liquid_preact__) * 1000
+        # saves the time that the pump was started
+        self.__on_time__ = time.monotonic()
 
-            # total deliver time
-            self.__total_deliver_time__ = self.__full_rate_time__ + self.__dribble_time__
+        if self.load_cell is not None:
+            self.__start_weight__ = self.load_cell.weight
+            self.__last_weight__ = self.__start_weight__
+            self.__last_time__ = self.__on_time__
+            self.__flow_rate__ = 0.0
 
-            # saves the time that the pump was started
-            self.__on_time__ = time.time()
+        self.__phase__ = 'full'
+        self.__running__ = True
 
-            self.__running__ = True
+    def delivered(self):
+        # mL delivered so far by the current (or last) delivery
+        return self.__liquid_count__
+
+    def __finish__(self, closed_loop, timed_out=False):
+        self.device.throttle = 0.0
+        self.__running__ = False
+        self.__phase__ = None
+
+        self.last_delivery = {
+            "target_mL": self.__liquid_total__,
+            "delivered_mL": self.__liquid_count__,
+            "overshoot_mL": self.__liquid_count__ - self.__liquid_total__,
+            "duration": time.monotonic() - self.__on_time__,
+            "closed_loop": closed_loop,
+            "timed_out": timed_out,
+        }
+
+    def __loop_open__(self, delta_time):
+        # if the delta time is less than the full rate time, then run the pump
+        # at full rate throttle. If it is between full rate time and total time,
+        # run the pump at the dribble time.
+        # If it is at or past the full deliver time, than shut the pump off.
+        if delta_time < self.__full_rate_time__:
+            self.device.throttle = self.throttle
+        elif delta_time < self.__total_deliver_time__:
+            self.device.throttle = self.dribble
+        else:
+            # without a scale, assume the nominal rates were met
+            self.__liquid_count__ = self.__liquid_total__
+            self.__finish__(closed_loop=False)
+
+    def __loop_closed__(self, now, delta_time):
+        weight = self.load_cell.weight
+        self.__liquid_count__ = (weight - self.__start_weight__) / self.density
+
+        # smoothed flow rate in mL/s from successive weights
+        dt = now - self.__last_time__
+        if dt > 0 and weight != self.__last_weight__:
+            rate = (weight - self.__last_weight__) / self.density / dt
+            self.__flow_rate__ = self.__flow_rate__ + 0.2 * (rate - self.__flow_rate__)
+            self.__last_weight__ = weight
+            self.__last_time__ = now
+
+        # liquid already pumped that the scale has not seen yet
+        in_flight = max(self.__flow_rate__, 0.0) * self.response_time
+        predicted = self.__liquid_count__ + in_flight
+
+        # give up well past the open loop estimate, e.g. an empty reservoir
+        if delta_time > 2 * self.__total_deliver_time__ + self.settle_time:
+            self.__finish__(closed_loop=True, timed_out=True)
+
+        elif self.__phase__ == 'full':
+            # slow down at the preact point
+            if predicted >= self.__liquid_total__ - self.__liquid_preact__:
+                self.__phase__ = 'dribble'
+                self.device.throttle = self.dribble
+            else:
+                self.device.throttle = self.throttle
+
+        elif self.__phase__ == 'dribble':
+            # stop on the target weight
+            if predicted >= self.__liquid_total__:
+                self.__phase__ = 'settling'
+                self.__stop_time__ = now
+                self.device.throttle = 0.0
+            else:
+                self.device.throttle = self.dribble
+
+        elif self.__phase__ == 'settling':
+            self.device.throttle = 0.0
+            if now - self.__stop_time__ >= self.settle_time:
+                self.__finish__(closed_loop=True)
 
     def loop(self):
 
         if self.isRunning():
             
             # calculate the delta time
-            delta_time = time.time() - self.__on_time__
+            now = time.monotonic()
+            delta_time = now - self.__on_time__
 
-            # if the delta time is less than the full rate time, then run the pump
-            # at full rate throttle. If it is between full rate time and total time,
-            # run the pump at the dribble time.
-            # If it is at or past the full deliver time, than shut the pump off.
-            if delta_time < self.__full_rate_time__:
-                self.device.throttle = self.throttle
-            elif delta_time >= self.__full_rate_time__ and delta_time < self.__total_deliver_time__:
-                self.device.throttle = self.dribble
-            elif delta_time >= self.__total_deliver_time__:
-                self.device.throttle = 0.0
+            if self.load_cell is not None:
+                self.__loop_closed__(now, delta_time)
+            else:
+                self.__loop_open__(delta_time)
 
         else:
             self.device.throttle = 0.0
 
+        # unchanged throttle writes are dropped by the shadow layer
+        self.control.flush()
+
 
 
 # if __name__ == '__main__':
 
+#     from runtime import DeviceRuntime
+
 #     # motor control classes
 #     b1 = MotorControl(name="Motor Control Board 1", address=0x60)
 #     b2 = MotorControl(name="Motor Control Board 2", address=0x61)
@@ -293,13 +650,24 @@ class Pump(object):
 #     # device array
 #     devices = [lc, p1, s2, p3, s4]
 
+#     runtime = DeviceRuntime()
+
 #     for i in control_boards:
 #         i.setup()
+#         runtime.add(i)
 
 #     for i in devices:
 #         i.setup()
 
-#     while True:
-#         for i in devices:
-#             i.loop()
-#         # end for
\ No newline at end of file
+#     # each device loop runs at its own loop_rate
+#     for i in devices:
+#         runtime.add(i)
+
+#     try:
+#         runtime.run()
+#     finally:
+#         runtime.teardown()
+#         print(runtime.stats())
+#         print(get_bus_manager().stats())
+#         for i in control_boards:
+#             print(i.stats())
@@ -0,0 +1,351 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Streaming filters for load cell values. Every filter has:
+#   update(sample)   - feed one sample, returns the filtered value
+#   process(samples) - feed a whole buffer in one vectorized call, returns
+#                      a numpy array of filtered values. The filter state
+#                      afterwards is the same as after calling update()
+#                      on each sample in turn.
+#   reset()          - forget all state
+# Filters can be chained with FilterChain.
+
+# Block recurrences are restarted before the running decay product
+# drops below this, to keep the division by it well conditioned.
+_MIN_DECAY = 1e-6
+_BLOCK = 4096
+
+# Scales the median absolute deviation to a standard deviation
+_MAD_SCALE = 1.4826
+
+
+def _recurrence(values, gains, initial):
+    # Evaluates y[k] = y[k-1] + gains[k] * (values[k] - y[k-1]) for the
+    # whole array at once. With D[k] = prod(1 - gains[:k+1]) the recurrence
+    # unrolls to y[k] = D[k] * (initial + cumsum(gains * values / D)[k]).
+    out = np.empty_like(values)
+    prev = initial
+    start = 0
+    n = len(values)
+    while start < n:
+        x = values[start:start + _BLOCK]
+        g = gains[start:start + _BLOCK]
+        decay = np.cumprod(1.0 - g)
+
+        cut = len(decay)
+        if decay[-1] < _MIN_DECAY:
+            cut = int(np.argmax(decay < _MIN_DECAY))
+
+        if cut == 0:
+            # this sample alone decays too far, step it directly
+            prev = prev + g[0] * (x[0] - prev)
+            out[start] = prev
+            start = start + 1
+            continue
+
+        d = decay[:cut]
+        out[start:start + cut] = d * (prev + np.cumsum(g[:cut] * x[:cut] / d))
+        prev = out[start + cut - 1]
+        start = start + cut
+    # end while
+    return out
+
+
+class BaseFilter(object):
+
+    def __init__(self):
+        self.value = None
+
+    def update(self, sample):
+        self.value = sample
+        return self.value
+
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=float)
+        if len(samples) > 0:
+            self.value = float(samples[-1])
+        return samples.copy()
+
+    def reset(self):
+        self.value = None
+
+
+class WindowFilter(BaseFilter):
+    # base class for filters over the last `window` samples,
+    # kept in a numpy ring buffer
+
+    def __init__(self, window=10):
+        super(WindowFilter, self).__init__()
+        if window < 1:
+            raise ValueError("Window must be at least one sample.")
+        self.window = window
+        self._buffer = np.zeros(window)
+        self._index = 0
+        self._count = 0
+
+    def _push(self, sample):
+        # returns the sample that fell out of the window, if any
+        dropped = None
+        if self._count == self.window:
+            dropped = self._buffer[self._index]
+        else:
+            self._count = self._count + 1
+        self._buffer[self._index] = sample
+        self._index = (self._index + 1) % self.window
+        return dropped
+
+    def _history(self):
+        # samples in the window, oldest first
+        if self._count < self.window:
+            return self._buffer[:self._count].copy()
+        return np.roll(self._buffer, -self._index)
+
+    def _load(self, samples):
+        # refills the window with the newest samples of a batch
+        tail = samples[-self.window:]
+        self._count = len(tail)
+        self._buffer[:self._count] = tail
+        self._index = self._count % self.window
+
+    def _extended(self, samples):
+        # (history + samples, length of history) for batch processing
+        samples = np.asarray(samples, dtype=float)
+        history = self._history()
+        return np.concatenate((history, samples)), len(history)
+
+    def _windows(self, data, offset):
+        # rows of trailing windows for every new sample; the first
+        # rows are padded with NaN while the window is still filling
+        width = min(self.window, len(data))
+        padded = np.concatenate((np.full(width - 1, np.nan), data))
+        return sliding_window_view(padded, width)[offset:]
+
+    def reset(self):
+        super(WindowFilter, self).reset()
+        self._index = 0
+        self._count = 0
+
+
+class RunningMean(WindowFilter):
+    # O(1) moving average over the last `window` samples
+
+    def __init__(self, window=10):
+        super(RunningMean, self).__init__(window)
+        self._sum = 0.0
+
+    def update(self, sample):
+        dropped = self._push(sample)
+        if dropped is not None:
+            self._sum = self._sum - dropped
+        self._sum = self._sum + sample
+
+        # re-sum once per lap of the window so rounding
+        # error cannot accumulate
+        if self._index == 0:
+            self._sum = float(np.sum(self._buffer[:self._count]))
+
+        self.value = self._sum / self._count
+        return self.value
+
+    def process(self, samples):
+        data, offset = self._extended(samples)
+        if len(data) == offset:
+            return np.empty(0)
+
+        sums = np.concatenate(([0.0], np.cumsum(data)))
+        end = np.arange(offset + 1, len(data) + 1)
+        start = np.maximum(end - self.window, 0)
+        out = (sums[end] - sums[start]) / (end - start)
+
+        self._load(data)
+        self._sum = float(np.sum(self._buffer[:self._count]))
+        self.value = float(out[-1])
+        return out
+
+    def reset(self):
+        super(RunningMean, self).reset()
+        self._sum = 0.0
+
+
+class SlidingMedian(WindowFilter):
+    # median of the last `window` samples
+
+    def update(self, sample):
+        self._push(sample)
+        self.value = float(np.median(self._buffer[:self._count]))
+        return self.value
+
+    def process(self, samples):
+        data, offset = self._extended(samples)
+        if len(data) == offset:
+            return np.empty(0)
+
+        out = np.nanmedian(self._windows(data, offset), axis=1)
+
+        self._load(data)
+        self.value = float(out[-1])
+        return out
+
+
+class ExponentialFilter(BaseFilter):
+    # exponential moving average; alpha is the weight of each new sample
+
+    def __init__(self, alpha=0.2):
+        super(ExponentialFilter, self).__init__()
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("Alpha must be in (0, 1].")
+        self.alpha = alpha
+
+    def update(self, sample):
+        if self.value is None:
+            self.value = float(sample)
+        else:
+            self.value = self.value + self.alpha * (sample - self.value)
+        return self.value
+
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=float)
+        if len(samples) == 0:
+            return np.empty(0)
+
+        initial = self.value
+        if initial is None:
+            initial = samples[0]
+
+        out = _recurrence(samples, np.full(len(samples), self.alpha), initial)
+        self.value = float(out[-1])
+        return out
+
+
+class KalmanFilter(BaseFilter):
+    # scalar Kalman filter for a value that is constant apart from
+    # random-walk drift. process_noise is the drift variance per sample,
+    # measurement_noise the variance of a single reading.
+
+    def __init__(self, process_noise=1.0, measurement_noise=100.0, error=None):
+        super(KalmanFilter, self).__init__()
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.initial_error = measurement_noise if error is None else error
+        self.error = self.initial_error
+
+    def __gain__(self):
+        # advances the error covariance by one sample, returns the gain
+        predicted = self.error + self.process_noise
+        gain = predicted / (predicted + self.measurement_noise)
+        self.error = (1.0 - gain) * predicted
+        return gain
+
+    def update(self, sample):
+        if self.value is None:
+            self.value = float(sample)
+            return self.value
+        self.value = self.value + self.__gain__() * (sample - self.value)
+        return self.value
+
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=float)
+        if len(samples) == 0:
+            return np.empty(0)
+
+        gains = np.empty(len(samples))
+        start = 0
+        initial = self.value
+        if initial is None:
+            # the first sample initializes the estimate
+            initial = samples[0]
+            gains[0] = 0.0
+            start = 1
+
+        # the gain sequence does not depend on the data and settles
+        # after a handful of samples, so only the transient is stepped
+        last = None
+        for i in range(start, len(samples)):
+            gain = self.__gain__()
+            gains[i] = gain
+            if last is not None and abs(gain - last) < 1e-12:
+                gains[i:] = gain
+                break
+            last = gain
+        # end for
+
+        out = _recurrence(samples, gains, initial)
+        self.value = float(out[-1])
+        return out
+
+    def reset(self):
+        super(KalmanFilter, self).reset()
+        self.error = self.initial_error
+
+
+class OutlierRejector(WindowFilter):
+    # Hampel filter: a sample further than `threshold` scaled median
+    # absolute deviations from the window median is replaced by the
+    # median. Raw samples stay in the window, so a genuine step change
+    # is accepted once it fills half of the window. min_deviation
+    # stops a perfectly quiet window from rejecting everything.
+
+    def __init__(self, window=15, threshold=3.0, min_deviation=0.0):
+        super(OutlierRejector, self).__init__(window)
+        self.threshold = threshold
+        self.min_deviation = min_deviation
+
+    def update(self, sample):
+        self._push(sample)
+        if self._count < 3:
+            self.value = float(sample)
+            return self.value
+
+        window = self._buffer[:self._count]
+        median = np.median(window)
+        limit = max(self.threshold * _MAD_SCALE * np.median(np.abs(window - median)), self.min_deviation)
+        if abs(sample - median) > limit:
+            self.value = float(median)
+        else:
+            self.value = float(sample)
+        return self.value
+
+    def process(self, samples):
+        data, offset = self._extended(samples)
+        if len(data) == offset:
+            return np.empty(0)
+
+        rows = self._windows(data, offset)
+        new = data[offset:]
+        median = np.nanmedian(rows, axis=1)
+        mad = np.nanmedian(np.abs(rows - median[:, None]), axis=1)
+        limit = np.maximum(self.threshold * _MAD_SCALE * mad, self.min_deviation)
+
+        filled = np.sum(~np.isnan(rows), axis=1)
+        out = np.where((filled >= 3) & (np.abs(new - median) > limit), median, new)
+
+        self._load(data)
+        self.value = float(out[-1])
+        return out
+
+
+class FilterChain(BaseFilter):
+    # feeds samples through each filter in order
+
+    def __init__(self, *filters):
+        super(FilterChain, self).__init__()
+        self.filters = list(filters)
+
+    def update(self, sample):
+        for f in self.filters:
+            sample = f.update(sample)
+        self.value = sample
+        return self.value
+
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=float)
+        for f in self.filters:
+            samples = f.process(samples)
+        if len(samples) > 0:
+            self.value = float(samples[-1])
+        return samples
+
+    def reset(self):
+        super(FilterChain, self).reset()
+        for f in self.filters:
+            f.reset()
@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+import pygame
+
+# default font used by the components
+DEFAULT_FONT_SIZE = 21
+
+# rendered text kept by the shared cache, in bytes of pixel data
+DEFAULT_CACHE_BYTES = 2 * 1024 * 1024
+
+
+__fonts__ = {}
+__fonts_lock__ = threading.Lock()
+
+
+def get_font(name=None, size=DEFAULT_FONT_SIZE):
+    # one pygame Font per (name, size) for the whole process.
+    # name None is the pygame default font.
+    key = (name, size)
+    with __fonts_lock__:
+        font = __fonts__.get(key)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(name, size)
+            __fonts__[key] = font
+        return font
+
+
+class TextCache(object):
+    # LRU cache of rendered text surfaces keyed on
+    # (font, text, color, antialias, background). The total pixel
+    # data held is kept under max_bytes; the least recently used
+    # surfaces are dropped first. Callers must not draw on the
+    # surfaces they get back, they are shared.
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.__entries__ = OrderedDict()
+        self.__lock__ = threading.Lock()
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, color, antialias=True, background=None):
+        color = tuple(pygame.Color(color))
+        if background is not None:
+            background = tuple(pygame.Color(background))
+        key = (font, text, color, antialias, background)
+
+        with self.__lock__:
+            entry = self.__entries__.get(key)
+            if entry is not None:
+                self.__entries__.move_to_end(key)
+                self.hits = self.hits + 1
+                return entry[0]
+
+        surface = font.render(text, antialias, color, background)
+        size = surface.get_pitch() * surface.get_height()
+
+        with self.__lock__:
+            self.misses = self.misses + 1
+            if size > self.max_bytes:
+                # too large to keep, hand it out uncached
+                return surface
+            if key not in self.__entries__:
+                self.__entries__[key] = (surface, size)
+                self.bytes = self.bytes + size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.__entries__.popitem(last=False)
+                self.bytes = self.bytes - evicted
+                self.evictions = self.evictions + 1
+            # end while
+        return surface
+
+    def clear(self):
+        with self.__lock__:
+            self.__entries__.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.__entries__)
+
+    def stats(self):
+        return {
+            "entries": len(self.__entries__),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+__text_cache__ = None
+
+
+def get_text_cache():
+    # the process wide text cache, created on first use
+    global __text_cache__
+    if __text_cache__ is None:
+        __text_cache__ = TextCache()
+    return __text_cache__
+
+
+def render_text(font, text, color, antialias=True, background=None):
+    return get_text_cache().render(font, text, color, antialias, background)
@@ -1,22 +1,45 @@
+import time
+import queue
 from transitions import Machine
-from threading import Timer
+from timers import TimerScheduler, TimerHandle
+from metrics import StateMachineMetrics
 
 class PillDispenser(object):
 
     states = [
         'asleep', 'splash_screen', 'wifi_ssid', 'wifi_security', 'loading_liquid_instructions', 'loading_pill_instructions',
-        'loading_liquid', 'loading_pill', 'schedule_setup', 'checking_schedule', 'med_time', 'deliver_meds'
+        'loading_liquid', 'loading_pill', 'schedule_setup', 'checking_schedule', 'med_time', 'deliver_meds',
         'waiting_cup_present','waiting_cup_clear',
     ]
 
-    def __init__(self, serial_number):
+    # latency spans measured while instrumentation is enabled,
+    # name -> (starting trigger, ending trigger)
+    spans = {
+        'dose': ('med_time', 'meds_delivered'),
+    }
+
+    def __init__(self, serial_number, scheduler=None):
 
         self.timer = None
         self.timeout_timer = None
         self.timer_pre = 10.0
         self.timeout_pre = 300.0
 
-        self.machine = Machine(model=self, states=PillDispenser.states, initial='asleep')
+        # all timers share one scheduler thread. Expiries are posted to
+        # self.events and only fire triggers from process_events(), so
+        # every transition runs on the thread that owns the machine.
+        self.scheduler = TimerScheduler() if scheduler is None else scheduler
+        self.events = queue.Queue()
+
+        # see enable_instrumentation()
+        self.metrics = None
+        self.__untimed__ = {}
+
+        # called with the new state after every state change
+        self.state_listeners = []
+
+        self.machine = Machine(model=self, states=PillDispenser.states, initial='asleep',
+                               after_state_change=self.__state_changed__)
 
         # add some transitions.
         self.machine.add_transition(trigger='wake_up', source='asleep', dest='splash_screen', before=self.reset_timers, after=self.start_timer)
@@ -39,7 +62,7 @@ class PillDispenser(object):
         self.machine.add_transition(trigger='med_time', source='checking_schedule', dest='waiting_cup_present', before=self.reset_timers)
         self.machine.add_transition(trigger='cup_on', source='waiting_cup_present', dest='deliver_meds',before=self.reset_timers)
         self.machine.add_transition(trigger='meds_delivered', source='deliver_meds', dest='waiting_cup_clear', before=self.reset_timers)
-        self.machine.add_transition(trigger='cup_clear', source='waiting_for_cup_clear', dest='checking_schedule', before=self.reset_timers)
+        self.machine.add_transition(trigger='cup_clear', source='waiting_cup_clear', dest='checking_schedule', before=self.reset_timers)
         
     # end init
 
@@ -64,8 +87,7 @@ class PillDispenser(object):
         self.reset_timers()
         
         print("FSM: Starting %s second timer..." % self.timer_pre)
-        self.timer = Timer(interval=self.timer_pre, function=self.timer_complete_delegate)
-        self.timer.start()
+        self.timer = self.__schedule__(self.timer_pre, 'timer_complete')
 
     def start_timeout(self):
 
@@ -74,16 +96,107 @@ class PillDispenser(object):
         self.reset_timers()
         
         print("FSM: Starting %s second timeout timer..." % self.timeout_pre)
-        self.timeout_timer = Timer(interval=self.timeout_pre, function=self.timeout_complete_delegate)
-        self.timeout_timer.start()
-
-    def timer_complete_delegate(self):
-        self.timer = None
-        self.timer_complete()
-
-    def timeout_complete_delegate(self):
-        self.timeout_timer = None
-        self.timeout_complete()
+        self.timeout_timer = self.__schedule__(self.timeout_pre, 'timeout_complete')
+
+    def __schedule__(self, delay, trigger):
+        # the handle is bound into its own callback, which runs on the
+        # scheduler thread. An expiry always posts the handle that
+        # fired, never self.timer / self.timeout_timer, which the
+        # machine thread may have replaced in the meantime.
+        handle = TimerHandle(self.scheduler, None)
+        handle.callback = lambda: self.post(trigger, handle)
+        handle.reschedule(delay)
+        return handle
+
+    def add_state_listener(self, callback):
+        self.state_listeners.append(callback)
+
+    def __state_changed__(self):
+        for callback in self.state_listeners:
+            callback(self.state)
+
+    def post(self, trigger, timer=None):
+        # queues a trigger to be fired by process_events(). Safe to
+        # call from any thread; hardware, timer and UI events all come
+        # in this way. A trigger posted by a timer is dropped if that
+        # timer was cancelled before it is processed.
+        self.events.put((trigger, timer))
+
+    def process_events(self, timeout=0.0):
+        # fires queued triggers on the calling thread. Waits up to
+        # timeout seconds for the first one (None waits forever).
+        # Returns the number of triggers fired.
+        fired = 0
+        block = timeout is None or timeout > 0
+        while True:
+            try:
+                trigger, timer = self.events.get(block=block, timeout=timeout)
+            except queue.Empty:
+                return fired
+            block = False
+
+            if timer is not None:
+                if timer.cancelled:
+                    continue
+                if timer is self.timer:
+                    self.timer = None
+                elif timer is self.timeout_timer:
+                    self.timeout_timer = None
+
+            # the state may have moved on since the event was posted
+            if trigger not in self.machine.get_triggers(self.state):
+                print("FSM: ignoring %s in state %s" % (trigger, self.state))
+                continue
+
+            self.trigger(trigger)
+            fired = fired + 1
+
+    def enable_instrumentation(self):
+        # wraps every trigger method with a timer. When disabled the
+        # original methods are restored, so there is no overhead at all.
+        if self.metrics is not None:
+            return
+
+        self.metrics = StateMachineMetrics(self.state, PillDispenser.spans)
+        for name in list(self.machine.events):
+            self.__untimed__[name] = getattr(self, name)
+            setattr(self, name, self.__timed__(name, self.__untimed__[name]))
+
+        # trigger('name') bypasses the named methods
+        untimed_trigger = self.trigger
+        self.__untimed__['trigger'] = untimed_trigger
+        def trigger(name, *args, **kwargs):
+            return self.__timed__(name, untimed_trigger)(name, *args, **kwargs)
+        self.trigger = trigger
+
+    def disable_instrumentation(self):
+        for name, method in self.__untimed__.items():
+            setattr(self, name, method)
+        self.__untimed__ = {}
+        self.metrics = None
+
+    def __timed__(self, name, method):
+        def timed(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                # a trigger that raised (e.g. MachineError) is counted,
+                # not timed
+                if self.metrics is not None:
+                    self.metrics.record_failure(name)
+                raise
+            if self.metrics is not None:
+                self.metrics.record(name, started, time.monotonic(), self.state)
+            return result
+        return timed
+
+    def instrumentation_snapshot(self):
+        # dict of trigger latency histograms and rates, time in each
+        # state and span latencies, or None when disabled
+        if self.metrics is None:
+            return None
+        return self.metrics.snapshot()
 
     def set_timer(self, interval):
         print("Setting timer to %s seconds." % interval)
@@ -0,0 +1,140 @@
+import time
+import heapq
+import threading
+
+import board
+
+# Transaction priorities, lower runs first. Stepper and motor
+# writes are timing critical; ADC polling can wait.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class I2CBusManager(object):
+    # Owns the single I2C bus shared by every device. Devices are
+    # handed a BusClient in place of board.I2C(); each transaction
+    # (one I2CDevice lock/unlock) waits in a priority queue until the
+    # bus is free, so transactions from different threads can never
+    # interleave and the highest priority waiter always goes next.
+
+    def __init__(self, i2c=None):
+        self.i2c = board.I2C() if i2c is None else i2c
+        self.clients = []
+
+        self.__condition__ = threading.Condition()
+        self.__owner__ = None
+        self.__waiting__ = []
+        self.__sequence__ = 0
+
+    def client(self, name, priority=PRIORITY_NORMAL):
+        client = BusClient(self, name, priority)
+        self.clients.append(client)
+        return client
+
+    def acquire(self, client):
+        with self.__condition__:
+            if self.__owner__ is None and len(self.__waiting__) == 0:
+                self.__owner__ = client
+                return
+
+            # queue up; equal priorities are served first come first served
+            self.__sequence__ = self.__sequence__ + 1
+            entry = (client.priority, self.__sequence__, client)
+            heapq.heappush(self.__waiting__, entry)
+            while self.__owner__ is not None or self.__waiting__[0] is not entry:
+                self.__condition__.wait()
+            heapq.heappop(self.__waiting__)
+            self.__owner__ = client
+
+    def release(self, client):
+        with self.__condition__:
+            if self.__owner__ is not client:
+                raise RuntimeError("%s released a bus it does not own." % client.name)
+            self.__owner__ = None
+            self.__condition__.notify_all()
+
+    def stats(self):
+        stats = {}
+        for client in self.clients:
+            stats[client.name] = client.stats()
+        return stats
+
+
+class BusClient(object):
+    # Stands in for a busio.I2C for one device. Drop it in wherever a
+    # library expects an i2c bus (I2CDevice, NAU7802, MotorKit, ...).
+
+    def __init__(self, manager, name, priority=PRIORITY_NORMAL):
+        self.manager = manager
+        self.name = name
+        self.priority = priority
+
+        # statistics
+        self.transactions = 0
+        self.operations = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+        self.__locked_time__ = None
+
+    def try_lock(self):
+        # blocks until this client owns the bus, then always succeeds
+        start = time.monotonic()
+        self.manager.acquire(self)
+        while not self.manager.i2c.try_lock():
+            time.sleep(0)
+        self.__locked_time__ = time.monotonic()
+
+        wait = self.__locked_time__ - start
+        self.total_wait = self.total_wait + wait
+        self.max_wait = max(self.max_wait, wait)
+        return True
+
+    def unlock(self):
+        latency = time.monotonic() - self.__locked_time__
+        self.transactions = self.transactions + 1
+        self.total_latency = self.total_latency + latency
+        self.max_latency = max(self.max_latency, latency)
+
+        self.manager.i2c.unlock()
+        self.manager.release(self)
+
+    def writeto(self, address, buffer, **kwargs):
+        self.operations = self.operations + 1
+        return self.manager.i2c.writeto(address, buffer, **kwargs)
+
+    def readfrom_into(self, address, buffer, **kwargs):
+        self.operations = self.operations + 1
+        return self.manager.i2c.readfrom_into(address, buffer, **kwargs)
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, **kwargs):
+        self.operations = self.operations + 1
+        return self.manager.i2c.writeto_then_readfrom(address, buffer_out, buffer_in, **kwargs)
+
+    def scan(self):
+        return self.manager.i2c.scan()
+
+    def stats(self):
+        return {
+            "priority": self.priority,
+            "transactions": self.transactions,
+            "operations": self.operations,
+            "mean_wait": self.total_wait / self.transactions if self.transactions else 0.0,
+            "max_wait": self.max_wait,
+            "mean_latency": self.total_latency / self.transactions if self.transactions else 0.0,
+            "max_latency": self.max_latency,
+        }
+
+
+__manager__ = None
+
+
+def get_bus_manager():
+    # the process wide bus manager, created on first use
+    global __manager__
+    if __manager__ is None:
+        __manager__ = I2CBusManager()
+    return __manager__
@@ -1,5 +1,6 @@
 from fsm import PillDispenser
-import time
+from db import ModelManager
+from scheduling import ScheduleEngine
 
 if __name__ == '__main__':
 
@@ -9,42 +10,58 @@ if __name__ == '__main__':
         # prints the initial state of the machine
         print("Current State: %s" %fsm.state)
 
-        # wake up the state machine
-        fsm.wake_up()
-
-        # keeps track of the last state
-        last_state = None
+        # the stored schedule arms a single timer for the next
+        # dose, which posts med_time to the machine
+        models = ModelManager()
+        schedule = ScheduleEngine(fsm.scheduler)
+        schedule.load(models.schedule)
+        schedule.bind_fsm(fsm)
 
-        # start comparing states
-        while True:
+        # reacts to every state change. Hardware, timer and UI
+        # events are posted to the machine's event queue.
+        def state_changed(state):
 
-                # This if statement prints out the state every time the 
+                # This prints out the state every time the
                 # state of the machine changes.
-                if last_state != fsm.state:
-                        print("Current State: %s" % fsm.state)
-                        last_state = fsm.state
-                # end if
+                print("Current State: %s" % state)
 
-                if fsm.is_wifi_ssid():
+                if state == 'wifi_ssid':
 
                         # set the timeout time for the next state,
                         # not the current one
                         fsm.set_timeout(60.0)
 
                         # simulate the ssid complete
-                        fsm.wifi_ssid_complete()
+                        fsm.post('wifi_ssid_complete')
 
-                elif fsm.is_wifi_security():
+                elif state == 'wifi_security':
 
                         # simulate the wifi security being typed
                         # in
-                        fsm.wifi_security_complete()
+                        fsm.post('wifi_security_complete')
 
-                elif fsm.is_loading_liquid():
+                elif state == 'loading_liquid':
                         
                         # TODO: Code for this section
-                        fsm.loading_liquid_complete()
+                        fsm.post('loading_liquid_complete')
+
+                elif state == 'waiting_cup_clear':
+
+                        # the due doses were delivered, record
+                        # them before the cup is taken away
+                        for medication in list(schedule.due):
+                                models.completed_meds.med_completed(medication)
+                                schedule.complete(medication)
 
+        fsm.add_state_listener(state_changed)
+
+        # wake up the state machine
+        fsm.wake_up()
+
+        # blocks until the next event instead of spinning; timer
+        # deadlines arrive as events too
+        while True:
+                fsm.process_events(timeout=None)
         # end while
         
-        print("System Completed.")
\ No newline at end of file
+        print("System Completed.")
@@ -0,0 +1,133 @@
+import time
+
+# latency histogram buckets are powers of two microseconds:
+# bucket i holds values in [2^i, 2^(i+1)) us, the last bucket
+# (about 38 hours) holds everything above
+_BUCKETS = 38
+
+
+class LatencyHistogram(object):
+    # log2 bucketed histogram of durations in seconds; constant
+    # memory and O(1) per recorded value
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        micros = int(seconds * 1e6)
+        index = 0 if micros < 1 else min(micros.bit_length() - 1, _BUCKETS - 1)
+        self.counts[index] = self.counts[index] + 1
+        self.count = self.count + 1
+        self.total = self.total + seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        # upper bound (seconds) of the bucket holding the percentile
+        if self.count == 0:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen = seen + count
+            if seen >= rank and count > 0:
+                return min((2 ** (index + 1)) / 1e6, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p90": self.percentile(0.90),
+            "p99": self.percentile(0.99),
+            # non-empty buckets keyed by their upper bound in microseconds
+            "buckets": dict((2 ** (i + 1), c) for i, c in enumerate(self.counts) if c > 0),
+        }
+
+
+class StateMachineMetrics(object):
+    # Per-trigger latency, trigger rate, time in each state, and the
+    # latency of spans between two triggers (e.g. med_time to
+    # meds_delivered). Fed by PillDispenser while instrumentation is on.
+
+    def __init__(self, state, spans=None):
+        now = time.monotonic()
+        self.started = now
+        self.triggers = {}
+        self.failures = {}
+        self.states = {}
+        self.spans = {}
+        self.__span_triggers__ = dict(spans or {})
+        self.__span_starts__ = {}
+
+        self.state = state
+        self.__state_entered__ = now
+        self.__state_entry__(state)
+
+    def __state_entry__(self, state):
+        if state not in self.states:
+            self.states[state] = {"entries": 0, "total_time": 0.0}
+        self.states[state]["entries"] = self.states[state]["entries"] + 1
+
+    def record(self, trigger, started, finished, state):
+        histogram = self.triggers.get(trigger)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self.triggers[trigger] = histogram
+        histogram.record(finished - started)
+
+        if state != self.state:
+            self.states[self.state]["total_time"] = self.states[self.state]["total_time"] + \
+                finished - self.__state_entered__
+            self.state = state
+            self.__state_entered__ = finished
+            self.__state_entry__(state)
+
+        for name, (begin, end) in self.__span_triggers__.items():
+            if trigger == begin:
+                self.__span_starts__[name] = started
+            elif trigger == end and name in self.__span_starts__:
+                if name not in self.spans:
+                    self.spans[name] = LatencyHistogram()
+                self.spans[name].record(finished - self.__span_starts__.pop(name))
+
+    def record_failure(self, trigger):
+        # a trigger that raised; kept out of the latency histograms
+        self.failures[trigger] = self.failures.get(trigger, 0) + 1
+
+    def snapshot(self):
+        now = time.monotonic()
+        elapsed = now - self.started
+
+        triggers = {}
+        for name, histogram in self.triggers.items():
+            triggers[name] = histogram.snapshot()
+            triggers[name]["rate"] = histogram.count / elapsed if elapsed > 0 else 0.0
+
+        states = {}
+        for name, entry in self.states.items():
+            states[name] = dict(entry)
+        # include the time spent in the current state so far
+        states[self.state]["total_time"] = states[self.state]["total_time"] + now - self.__state_entered__
+
+        spans = {}
+        for name, histogram in self.spans.items():
+            spans[name] = histogram.snapshot()
+
+        return {
+            "elapsed": elapsed,
+            "state": self.state,
+            "triggers": triggers,
+            "failures": dict(self.failures),
+            "states": states,
+            "spans": spans,
+        }
@@ -0,0 +1,129 @@
+import math
+import time
+import threading
+from array import array
+
+
+def trapezoid_schedule(steps, max_speed, acceleration):
+    # Returns an array with the time (seconds from the start of the move)
+    # at which each of `steps` steps should be taken, for a move that
+    # accelerates at `acceleration` steps/s^2 up to `max_speed` steps/s,
+    # cruises, and decelerates symmetrically to a stop. Short moves that
+    # never reach max_speed get a triangular profile.
+    schedule = array('d')
+    if steps <= 0:
+        return schedule
+
+    # steps spent accelerating, capped at half of the move
+    accel_steps = min((max_speed * max_speed) / (2.0 * acceleration), steps / 2.0)
+    peak_speed = math.sqrt(2.0 * acceleration * accel_steps)
+    accel_time = peak_speed / acceleration
+
+    def time_to(position):
+        # time to cover `position` steps from rest on the first half
+        if position <= accel_steps:
+            return math.sqrt(2.0 * position / acceleration)
+        return accel_time + (position - accel_steps) / peak_speed
+
+    half = steps / 2.0
+    total_time = 2.0 * time_to(half)
+
+    for k in range(1, steps + 1):
+        if k <= half:
+            schedule.append(time_to(k))
+        else:
+            schedule.append(total_time - time_to(steps - k))
+    # end for
+    return schedule
+
+
+class MotionPlanner(object):
+    # Runs a step schedule for one stepper on a dedicated timing thread.
+    # Each step is issued at its scheduled time regardless of what the
+    # rest of the program is doing. If a step is late (for example the
+    # I2C write took too long) the following steps are issued
+    # immediately until the schedule is caught up.
+    #
+    # Listeners are called from the timing thread as
+    # callback(event, steps_done, steps_total) with event 'progress'
+    # (every progress_interval steps) or 'complete'.
+
+    def __init__(self, step_function, max_speed=800.0, acceleration=1600.0, progress_interval=100):
+        self.step_function = step_function
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.progress_interval = progress_interval
+
+        self.listeners = []
+        self.steps_done = 0
+        self.steps_total = 0
+        self.late_steps = 0
+        self.completed = threading.Event()
+        self.completed.set()
+
+        self.__thread__ = None
+        self.__stop__ = threading.Event()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def isMoving(self):
+        return self.__thread__ is not None and self.__thread__.is_alive()
+
+    @property
+    def progress(self):
+        # fraction of the current (or last) move completed
+        if self.steps_total == 0:
+            return 1.0
+        return self.steps_done / self.steps_total
+
+    def start(self, steps, direction):
+        if self.isMoving():
+            raise RuntimeError("A move is already in progress.")
+
+        schedule = trapezoid_schedule(steps, self.max_speed, self.acceleration)
+        self.steps_done = 0
+        self.steps_total = len(schedule)
+        self.late_steps = 0
+        self.completed.clear()
+        self.__stop__.clear()
+        self.__thread__ = threading.Thread(target=self.__run__, args=(schedule, direction), name="MotionPlanner", daemon=True)
+        self.__thread__.start()
+
+    def stop(self):
+        # abandons the current move after the step in progress
+        self.__stop__.set()
+        if self.__thread__ is not None:
+            self.__thread__.join()
+            self.__thread__ = None
+
+    def wait(self, timeout=None):
+        # blocks until the current move completes
+        return self.completed.wait(timeout)
+
+    def __run__(self, schedule, direction):
+        start = time.monotonic()
+        try:
+            for step_time in schedule:
+                delay = start + step_time - time.monotonic()
+                if delay > 0:
+                    if self.__stop__.wait(delay):
+                        break
+                elif self.__stop__.is_set():
+                    break
+                else:
+                    self.late_steps = self.late_steps + 1
+
+                self.step_function(direction)
+                self.steps_done = self.steps_done + 1
+
+                if self.progress_interval and self.steps_done % self.progress_interval == 0:
+                    self.__fire__('progress')
+            # end for
+        finally:
+            self.__fire__('complete')
+            self.completed.set()
+
+    def __fire__(self, event):
+        for callback in self.listeners:
+            callback(event, self.steps_done, self.steps_total)
@@ -0,0 +1,138 @@
+import struct
+import threading
+
+# first PWM register (LED0_ON_L); each channel has 4 registers
+# ON_L, ON_H, OFF_L, OFF_H
+_LED0_ON_L = 0x06
+_FULL_ON = 0x1000
+
+
+class ShadowChannel(object):
+    # Drop-in for adafruit_pca9685.PWMChannel. duty_cycle writes only
+    # update the shadow copy of the channel registers; the hardware is
+    # written by ShadowPWM.flush().
+
+    def __init__(self, shadow, index):
+        self._shadow = shadow
+        self._index = index
+
+    @property
+    def frequency(self):
+        return self._shadow.pca.frequency
+
+    @frequency.setter
+    def frequency(self, _):
+        raise NotImplementedError("frequency cannot be set on individual channels")
+
+    @property
+    def duty_cycle(self):
+        on, off = self._shadow.read(self._index)
+        if on == _FULL_ON:
+            return 0xFFFF
+        return off << 4
+
+    @duty_cycle.setter
+    def duty_cycle(self, value):
+        if not 0 <= value <= 0xFFFF:
+            raise ValueError("Out of range")
+
+        # same register encoding as PWMChannel
+        if value == 0xFFFF:
+            self._shadow.write(self._index, (_FULL_ON, 0))
+        else:
+            self._shadow.write(self._index, (0, (value + 1) >> 4))
+
+
+class ShadowPWM(object):
+    # Shadow register layer for the 16 PWM channels of a PCA9685.
+    # Installed in place of pca.channels, so motors and steppers built
+    # by MotorKit afterwards write here. Writes that do not change a
+    # channel are dropped, and flush() sends every changed channel in
+    # one auto-increment block write per run of neighbouring channels.
+
+    def __init__(self, pca):
+        self.pca = pca
+        self._channels = [ShadowChannel(self, i) for i in range(16)]
+
+        # register values known to be on the chip, None until written
+        self.__device__ = [None] * 16
+        self.__pending__ = {}
+        self.__lock__ = threading.Lock()
+
+        # statistics
+        self.writes_requested = 0
+        self.writes_suppressed = 0
+        self.channel_writes = 0
+        self.transactions = 0
+
+    def __len__(self):
+        return 16
+
+    def __getitem__(self, index):
+        return self._channels[index]
+
+    def read(self, index):
+        with self.__lock__:
+            if index in self.__pending__:
+                return self.__pending__[index]
+            if self.__device__[index] is not None:
+                return self.__device__[index]
+        return self.pca.pwm_regs[index]
+
+    def write(self, index, registers):
+        with self.__lock__:
+            self.writes_requested = self.writes_requested + 1
+            if registers == self.__device__[index]:
+                # back to what the chip already has
+                self.__pending__.pop(index, None)
+                self.writes_suppressed = self.writes_suppressed + 1
+            elif self.__pending__.get(index) == registers:
+                self.writes_suppressed = self.writes_suppressed + 1
+            else:
+                self.__pending__[index] = registers
+
+    def flush(self):
+        # writes the pending channels; returns the number of transactions
+        with self.__lock__:
+            if len(self.__pending__) == 0:
+                return 0
+
+            pending = self.__pending__
+            self.__pending__ = {}
+            for index in pending:
+                self.__device__[index] = pending[index]
+
+            # block writes cover runs of consecutive pending channels.
+            # Channels in between are re-sent only when their value is
+            # known, which is cheaper than starting another transaction.
+            spans = []
+            for index in sorted(pending):
+                if len(spans) > 0:
+                    last = spans[-1][1]
+                    gap = range(last + 1, index)
+                    if all(self.__device__[i] is not None for i in gap):
+                        spans[-1][1] = index
+                        continue
+                spans.append([index, index])
+            # end for
+
+            with self.pca.i2c_device as i2c:
+                for first, last in spans:
+                    buffer = bytearray([_LED0_ON_L + 4 * first])
+                    for index in range(first, last + 1):
+                        buffer.extend(struct.pack("<HH", *self.__device__[index]))
+                    i2c.write(buffer)
+            # end with
+
+            self.channel_writes = self.channel_writes + len(pending)
+            self.transactions = self.transactions + len(spans)
+            return len(spans)
+
+    def stats(self):
+        return {
+            "writes_requested": self.writes_requested,
+            "writes_suppressed": self.writes_suppressed,
+            "channel_writes": self.channel_writes,
+            "transactions": self.transactions,
+            "writes_saved": self.writes_requested - self.transactions,
+        }
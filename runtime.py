@@ -0,0 +1,129 @@
+import time
+import heapq
+
+
+class ScheduledTask(object):
+    # one device loop() run at a fixed rate. A run overruns when it
+    # finishes later than `deadline` seconds after it was due.
+
+    def __init__(self, device, rate, deadline=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+
+        self.device = device
+        self.name = getattr(device, 'name', type(device).__name__)
+        self.period = 1.0 / rate
+        self.deadline = self.period if deadline is None else deadline
+        self.next_time = 0.0
+
+        # statistics
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.max_lateness = 0.0
+
+    def stats(self):
+        return {
+            "rate": 1.0 / self.period,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "mean_time": self.total_time / self.runs if self.runs else 0.0,
+            "max_time": self.max_time,
+            "max_lateness": self.max_lateness,
+        }
+
+
+class DeviceRuntime(object):
+    # Cooperative scheduler for device loops on a monotonic clock.
+    # Each device runs at its own loop_rate (Hz) with an optional
+    # loop_deadline (seconds), taken from the device unless given to
+    # add(). Between runs the runtime sleeps until the next one is due,
+    # so an idle system costs no CPU. A task that falls a whole period
+    # behind skips the missed runs instead of running back-to-back.
+
+    def __init__(self):
+        self.tasks = []
+        self.running = False
+        self.__queue__ = []
+        self.__sequence__ = 0
+
+    def add(self, device, rate=None, deadline=None):
+        if rate is None:
+            rate = getattr(device, 'loop_rate', 10.0)
+        if deadline is None:
+            deadline = getattr(device, 'loop_deadline', None)
+
+        task = ScheduledTask(device, rate, deadline)
+        task.next_time = time.monotonic()
+        self.tasks.append(task)
+        self.__push__(task)
+        return task
+
+    def __push__(self, task):
+        # the sequence number keeps equal deadlines in insertion order
+        self.__sequence__ = self.__sequence__ + 1
+        heapq.heappush(self.__queue__, (task.next_time, self.__sequence__, task))
+
+    def run_once(self):
+        # runs the next due task, sleeping until it is due
+        if len(self.__queue__) == 0:
+            return None
+
+        due, seq, task = heapq.heappop(self.__queue__)
+        now = time.monotonic()
+        if due > now:
+            time.sleep(due - now)
+
+        start = time.monotonic()
+        task.device.loop()
+        end = time.monotonic()
+
+        elapsed = end - start
+        task.runs = task.runs + 1
+        task.total_time = task.total_time + elapsed
+        task.max_time = max(task.max_time, elapsed)
+        task.max_lateness = max(task.max_lateness, start - due)
+        if end - due > task.deadline:
+            task.overruns = task.overruns + 1
+
+        # schedule the next run, skipping whole periods we fell behind
+        task.next_time = due + task.period
+        if task.next_time < end:
+            missed = int((end - task.next_time) / task.period) + 1
+            task.skipped = task.skipped + missed
+            task.next_time = task.next_time + missed * task.period
+
+        self.__push__(task)
+        return task
+
+    def run(self, duration=None):
+        self.running = True
+        stop_time = None if duration is None else time.monotonic() + duration
+        while self.running:
+            if stop_time is not None and time.monotonic() >= stop_time:
+                break
+            if self.run_once() is None:
+                break
+        # end while
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def teardown(self):
+        # lets every device release what it holds (threads, files)
+        # once the runtime is done with it
+        for task in self.tasks:
+            teardown = getattr(task.device, 'teardown', None)
+            if teardown is not None:
+                teardown()
+        # end for
+
+    def stats(self):
+        stats = {}
+        for task in self.tasks:
+            stats[task.name] = task.stats()
+        return stats
@@ -0,0 +1,184 @@
+import time
+import heapq
+import threading
+from datetime import date, datetime, timedelta
+
+# medications with a time in ScheduleModel, by column
+SCHEDULE_COLUMNS = {
+    'liquid1': 'liquid1_time',
+    'liquid2': 'liquid2_time',
+    'pill1': 'pill1_time',
+    'pill2': 'pill2_time',
+}
+
+# longest the timer is armed for. Deadlines are wall clock times
+# and the timer runs on time.monotonic(), so the timer wakes at
+# least this often to catch clock steps (NTP sync, manual set).
+MAX_TIMER_DELAY = 600.0
+
+
+def occurrence(day, time_of_day):
+    # unix time of time_of_day (seconds after local midnight) on a
+    # date. The local wall clock time goes through mktime with
+    # isdst=-1, so the dose stays at the same clock time across
+    # DST changes. A time that does not exist on a spring forward
+    # day moves forward by the gap.
+    moment = datetime.combine(day, datetime.min.time()) + timedelta(seconds=time_of_day)
+    return time.mktime(moment.timetuple()[:8] + (-1,))
+
+
+class ScheduleEngine(object):
+    # Compiles the daily dose times into a min-heap of upcoming
+    # deadlines. next_due() is O(1) (amortized over the lazily
+    # dropped entries) and exactly one TimerScheduler timer is armed,
+    # for the earliest deadline. Changing one dose time is O(log n):
+    # the old heap entry is orphaned and the new one pushed.
+    #
+    # When doses fall due, the listeners are called on the scheduler
+    # thread as callback(medications, deadline). Due medications stay
+    # in self.due until complete() is called for them.
+
+    def __init__(self, scheduler, clock=time.time):
+        self.scheduler = scheduler
+        self.clock = clock
+
+        self.times = {}
+        self.due = []
+        self.listeners = []
+
+        self.__heap__ = []
+        self.__entries__ = {}
+        self.__sequence__ = 0
+        self.__timer__ = None
+        self.__armed_for__ = None
+        self.__lock__ = threading.RLock()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def bind_fsm(self, fsm):
+        # posts med_time when a dose is due, and again whenever the
+        # machine gets back to checking_schedule with doses still due
+        # (a med_time posted in another state is dropped)
+        def due(medications, deadline):
+            fsm.post('med_time')
+        def state_changed(state):
+            if state == 'checking_schedule' and len(self.due) > 0:
+                fsm.post('med_time')
+        self.add_listener(due)
+        fsm.add_state_listener(state_changed)
+
+    def load(self, schedule_model):
+        # reads the latest schedule; only the doses that changed
+        # touch the heap
+        schedule_model.load()
+        for medication, column in SCHEDULE_COLUMNS.items():
+            self.set_dose(medication, getattr(schedule_model, column))
+        # end for
+
+    def set_dose(self, medication, time_of_day):
+        # time_of_day is seconds after local midnight, None removes
+        # the dose
+        with self.__lock__:
+            if self.times.get(medication) == time_of_day:
+                return
+            self.__remove__(medication)
+            if time_of_day is None:
+                self.times.pop(medication, None)
+            else:
+                if not 0 <= time_of_day < 86400:
+                    raise ValueError("time_of_day must be in [0, 86400) seconds.")
+                self.times[medication] = time_of_day
+                self.__push__(medication, self.__first_day__(time_of_day))
+            self.__arm__()
+
+    def remove_dose(self, medication):
+        self.set_dose(medication, None)
+
+    def next_due(self):
+        # (deadline, medication) of the next dose, or None
+        with self.__lock__:
+            self.__discard__()
+            if len(self.__heap__) == 0:
+                return None
+            return self.__heap__[0][0], self.__heap__[0][2]
+
+    def complete(self, medication):
+        with self.__lock__:
+            if medication in self.due:
+                self.due.remove(medication)
+
+    def stop(self):
+        with self.__lock__:
+            if self.__timer__ is not None:
+                self.__timer__.cancel()
+                self.__timer__ = None
+                self.__armed_for__ = None
+
+    def __first_day__(self, time_of_day):
+        # the next date the dose is still ahead on
+        day = date.fromtimestamp(self.clock())
+        if occurrence(day, time_of_day) <= self.clock():
+            day = day + timedelta(days=1)
+        return day
+
+    def __push__(self, medication, day):
+        self.__sequence__ = self.__sequence__ + 1
+        entry = [occurrence(day, self.times[medication]), self.__sequence__, medication, day]
+        self.__entries__[medication] = entry
+        heapq.heappush(self.__heap__, entry)
+
+    def __remove__(self, medication):
+        entry = self.__entries__.pop(medication, None)
+        if entry is not None:
+            # orphaned, dropped when it reaches the top
+            entry[2] = None
+
+    def __discard__(self):
+        while len(self.__heap__) > 0 and self.__heap__[0][2] is None:
+            heapq.heappop(self.__heap__)
+
+    def __arm__(self):
+        # keeps the single timer aimed at the top of the heap
+        self.__discard__()
+        if len(self.__heap__) == 0:
+            self.stop()
+            return
+
+        deadline = self.__heap__[0][0]
+        if self.__timer__ is not None and not self.__timer__.expired and self.__armed_for__ == deadline:
+            return
+
+        delay = min(max(0.0, deadline - self.clock()), MAX_TIMER_DELAY)
+
+        if self.__timer__ is None:
+            self.__timer__ = self.scheduler.schedule(delay, self.__expired__)
+        else:
+            self.__timer__.reschedule(delay)
+        self.__armed_for__ = deadline
+
+    def __expired__(self):
+        # runs on the scheduler thread
+        with self.__lock__:
+            now = self.clock()
+            medications = []
+            deadline = None
+            while True:
+                self.__discard__()
+                if len(self.__heap__) == 0 or self.__heap__[0][0] > now:
+                    break
+                entry = heapq.heappop(self.__heap__)
+                medication, day = entry[2], entry[3]
+                medications.append(medication)
+                deadline = entry[0] if deadline is None else min(deadline, entry[0])
+                if medication not in self.due:
+                    self.due.append(medication)
+
+                # same clock time tomorrow
+                self.__push__(medication, day + timedelta(days=1))
+            # end while
+            self.__arm__()
+
+        if len(medications) > 0:
+            for callback in self.listeners:
+                callback(medications, deadline)
@@ -1,8 +1,8 @@
 import pygame
-import os
 import time
 from pygame_vkeyboard import *
 from components import *
+import assets
 
 # CONSTANTS
 SCREEN_SIZE = (480,320)
@@ -21,6 +21,29 @@ clock = pygame.time.Clock()
 class BaseScreen(object):
     name = "General Screen"
 
+    # False until the whole screen has been drawn once. draw()
+    # returns the rects it changed; the first draw after entering
+    # the screen returns the full screen.
+    screen_shown = False
+
+    def invalidate(self):
+        self.screen_shown = False
+
+    def reset(self, **kwargs):
+        # called when a pooled screen is handed out again; puts
+        # the screen back to its just constructed state
+        self.invalidate()
+
+    def is_animating(self):
+        # True while the screen needs frames drawn without waiting
+        # for input. A screen that has not been drawn yet needs one.
+        return not self.screen_shown
+
+    def next_deadline(self):
+        # time.time() of the next timer the screen has to
+        # service from draw(), or None
+        return None
+
     def on_enter(self):
         print("Entering %s screen..." % self.name)
 
@@ -34,12 +57,43 @@ class BaseScreen(object):
         pass
 
     def draw(self, sm):
-        pass
+        return []
 
 
-class ScreenManager(object):
+class ScreenPool(object):
+    # Keeps screen instances around after they are popped so the
+    # next visit reuses them (and their keyboards, fonts and images)
+    # instead of constructing new ones. get() hands out an idle
+    # instance after calling its reset() hook with the same keyword
+    # arguments the constructor takes.
+
     def __init__(self):
+        self.instances = {}
+
+    def get(self, screen_class, in_use=(), **kwargs):
+        for instance in self.instances.get(screen_class, []):
+            if instance not in in_use:
+                instance.reset(**kwargs)
+                return instance
+
+        instance = screen_class(**kwargs)
+        self.instances.setdefault(screen_class, []).append(instance)
+        return instance
+
+    def preload(self, *screen_classes):
+        # builds one instance of each class ahead of time
+        for screen_class in screen_classes:
+            if len(self.instances.get(screen_class, [])) == 0:
+                self.instances[screen_class] = [screen_class()]
+
+    def clear(self):
+        self.instances = {}
+
+
+class ScreenManager(object):
+    def __init__(self, pool=None):
         self.screens = []
+        self.pool = ScreenPool() if pool is None else pool
 
     def is_empty(self):
         if len(self.screens) == 0:
@@ -49,6 +103,7 @@ class ScreenManager(object):
 
     def enter_screen(self):
         if len(self.screens) > 0:
+            self.screens[-1].invalidate()
             self.screens[-1].on_enter()
 
     def exit_screen(self):
@@ -68,7 +123,26 @@ class ScreenManager(object):
     def draw(self):
 
         if len(self.screens) > 0:
-            self.screens[-1].draw(self)
+            rects = self.screens[-1].draw(self)
+
+            # one display update per frame, covering only
+            # the rects the screen changed
+            if rects:
+                pygame.display.update(rects)
+
+    def is_animating(self):
+        if len(self.screens) > 0:
+            return self.screens[-1].is_animating()
+        return False
+
+    def next_deadline(self):
+        if len(self.screens) > 0:
+            return self.screens[-1].next_deadline()
+        return None
+
+    def get_screen(self, screen_class, **kwargs):
+        # a pooled screen that is not already on the stack
+        return self.pool.get(screen_class, in_use=self.screens, **kwargs)
 
     def push(self, screen):
         self.exit_screen()
@@ -92,13 +166,70 @@ class ScreenManager(object):
         while len(self.screens) > 0:
             self.pop()
 
+class FrameScheduler(object):
+    # Paces the main loop. While the screen is animating, or for
+    # active_time seconds after the last input, frames run at fps
+    # using the pygame clock. Otherwise the loop blocks in
+    # pygame.event.wait until an event arrives or the next screen
+    # timer is due, so an idle screen does not wake at all.
+
+    def __init__(self, clock, fps=30, active_time=0.5, max_idle=None):
+        self.clock = clock
+        self.fps = fps
+        self.active_time = active_time
+        # longest idle wait in seconds, None waits for an event
+        self.max_idle = max_idle
+        self.last_input = 0.0
+
+    def is_active(self, sm):
+        if sm.is_animating():
+            return True
+        return (time.time() - self.last_input) < self.active_time
+
+    def next_frame(self, sm):
+        # returns the events for the next frame
+        if self.is_active(sm):
+            self.clock.tick(self.fps)
+            events = pygame.event.get()
+        else:
+            events = self.wait(sm)
+            # keep the clock current for the next active frame
+            self.clock.tick()
+
+        if len(events) > 0:
+            self.last_input = time.time()
+        return events
+
+    def wait(self, sm):
+        timeout = self.max_idle
+        deadline = sm.next_deadline()
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.time())
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+
+        if timeout is None:
+            event = pygame.event.wait()
+        else:
+            # a timeout of 0 would block forever
+            event = pygame.event.wait(max(1, int(timeout * 1000)))
+
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+
 class SplashScreen(BaseScreen):
     name = "Splash Screen"
 
     def __init__(self):
         self.timer = OnLoopTimer(self.timer_complete, 5)
-        self.image = pygame.image.load(os.path.join('resource','img','logo.jpg'), "logo").convert()
+        self.image = assets.load_image('logo.jpg')
         self.screen_manager = None
+
+    def reset(self, **kwargs):
+        BaseScreen.reset(self)
+        self.timer.started = None
     
     def input(self, sm, events):
         pass
@@ -110,16 +241,27 @@ class SplashScreen(BaseScreen):
 
         # loop the timer class to see
         # if the timer has been completed
-        self.timer.loop()
         self.screen_manager = sm
+        self.timer.loop()
+
+        # the logo never changes, draw it once
+        if self.screen_shown or sm.screens[-1] is not self:
+            return []
 
-        pygame.display.flip()
         screen.blit(self.image, (0,0))
+        self.screen_shown = True
+        return [screen.get_rect()]
     
+    def next_deadline(self):
+        if self.timer.started is None:
+            # the timer starts on the first draw
+            return time.time()
+        return self.timer.deadline()
+
     def timer_complete(self):
         print("Timer Complete!")
         if self.screen_manager is not None:
-            self.screen_manager.push(Wifi_SSID_Screen())
+            self.screen_manager.push(self.screen_manager.get_screen(Wifi_SSID_Screen))
         else:
             raise Exception("timer_complete has no screen manager...")
 
@@ -141,6 +283,12 @@ class Wifi_SSID_Screen(BaseScreen):
         self.ssid_field.label_text = "Enter SSID for WiFi Connection"
         self.screen_manager = None
 
+    def reset(self, **kwargs):
+        BaseScreen.reset(self)
+        self.keyboard.set_text("")
+        self.ssid_field.set_user_text("")
+        self.next_button.pressed = False
+
     def on_enter(self):
         pass
 
@@ -156,8 +304,6 @@ class Wifi_SSID_Screen(BaseScreen):
         self.ssid_field.update(events)
         self.next_button.update(events)
 
-        pygame.display.update()
-
     def keyboard_consumer(self, text):
         if self.ssid_field.active:
             self.ssid_field.set_user_text(text)
@@ -166,7 +312,7 @@ class Wifi_SSID_Screen(BaseScreen):
 
     def next_clicked(self):
         if self.screen_manager is not None:
-            self.screen_manager.push(Wifi_PSK_Screen(ssid=self.ssid_field.user_text))
+            self.screen_manager.push(self.screen_manager.get_screen(Wifi_PSK_Screen, ssid=self.ssid_field.user_text))
 
     def draw(self, sm):
 
@@ -174,24 +320,28 @@ class Wifi_SSID_Screen(BaseScreen):
         self.screen_manager = sm
 
         if not self.screen_shown:
-            # fills the screen with white
+            # fills the screen with white and redraws everything
             screen.fill(COLOR_WHITE)
+            self.ssid_field.mark_dirty()
+            self.next_button.mark_dirty()
+
+        rects = []
 
         # draw the input field
-        self.ssid_field.draw(screen)
+        rects.extend(self.ssid_field.draw(screen))
 
         # draw the next button
-        self.next_button.draw(screen)
+        rects.extend(self.next_button.draw(screen))
 
-        # draw the keyboard
-        self.keyboard.draw()
+        # draw the keyboard, only the keys that changed
+        # unless the screen was just filled
+        rects.extend(self.keyboard.draw(force=not self.screen_shown))
 
-        # flip the display. Can only flip
-        # the screen once otherwise the 
-        # on-screen keyboard goes away
         if not self.screen_shown:
-            pygame.display.flip()
             self.screen_shown = True
+            return [screen.get_rect()]
+
+        return rects
 
 
 class Wifi_PSK_Screen(BaseScreen):
@@ -210,12 +360,22 @@ class Wifi_PSK_Screen(BaseScreen):
 
         self.psk_field.label_text = "Enter Passphrase for WiFi Connection"
 
+        self.set_ssid(**kwargs)
+
+    def set_ssid(self, **kwargs):
         if "ssid" in kwargs:
             self.ssid = kwargs['ssid']
             print("SSID = %s" % self.ssid)
         else:
             self.ssid = None
 
+    def reset(self, **kwargs):
+        BaseScreen.reset(self)
+        self.keyboard.set_text("")
+        self.psk_field.set_user_text("")
+        self.next_button.pressed = False
+        self.set_ssid(**kwargs)
+
     def on_enter(self):
         pass
 
@@ -231,8 +391,6 @@ class Wifi_PSK_Screen(BaseScreen):
         self.psk_field.update(events)
         self.next_button.update(events)
 
-        pygame.display.update()
-
     def keyboard_consumer(self, text):
         if self.psk_field.active:
             self.psk_field.set_user_text(text)
@@ -245,24 +403,28 @@ class Wifi_PSK_Screen(BaseScreen):
     def draw(self, sm):
 
         if not self.screen_shown:
-            # fills the screen with white
+            # fills the screen with white and redraws everything
             screen.fill(COLOR_WHITE)
+            self.psk_field.mark_dirty()
+            self.next_button.mark_dirty()
+
+        rects = []
 
         # draw the input field
-        self.psk_field.draw(screen)
+        rects.extend(self.psk_field.draw(screen))
 
         # draw the next button
-        self.next_button.draw(screen)
+        rects.extend(self.next_button.draw(screen))
 
-        # draw the keyboard
-        self.keyboard.draw()
+        # draw the keyboard, only the keys that changed
+        # unless the screen was just filled
+        rects.extend(self.keyboard.draw(force=not self.screen_shown))
 
-        # flip the display. Can only flip
-        # the screen once otherwise the 
-        # on-screen keyboard goes away
         if not self.screen_shown:
-            pygame.display.flip()
             self.screen_shown = True
+            return [screen.get_rect()]
+
+        return rects
 
 class MainScreen(BaseScreen):
 
@@ -270,34 +432,53 @@ class MainScreen(BaseScreen):
         
         self.components = []
 
-    def input(self, events):
+    def input(self, sm, events):
         for i in self.components:
             i.input(events)
 
-    def update(self, events):
+    def update(self, sm, events):
         for i in self.components:
             i.update(events)
 
     def nav_clicked(self):
         pass
 
-    def draw(self, screen_manager):
+    def draw(self, sm):
+        if not self.screen_shown:
+            screen.fill(COLOR_WHITE)
+            for i in self.components:
+                i.mark_dirty()
+
+        rects = []
         for i in self.components:
-            i.draw(screen_manager)
+            rects.extend(i.draw(screen))
+
+        if not self.screen_shown:
+            self.screen_shown = True
+            return [screen.get_rect()]
+
+        return rects
 
 if __name__ == '__main__':
 
     Running = True
 
     sm = ScreenManager()
+    pacer = FrameScheduler(clock, fps=30)
+
+    # decode the images and build the screens up front
+    # so the first transitions do not pay for it
+    assets.preload('logo.jpg')
+    sm.pool.preload(SplashScreen, Wifi_SSID_Screen, Wifi_PSK_Screen)
 
     # push the initial screen to the system
-    sm.push(SplashScreen())
+    sm.push(sm.get_screen(SplashScreen))
 
     while Running:
 
-        # allows use for the "X" button to quit.
-        events = pygame.event.get()
+        # waits for the next frame; allows use
+        # for the "X" button to quit.
+        events = pacer.next_frame(sm)
 
         sm.input(events)
         sm.update(events)
@@ -312,6 +493,3 @@ if __name__ == '__main__':
         for event in events:
             if event.type == pygame.QUIT:
                 sm.clear()
-
-        #print("sleeping...")
-        time.sleep(0.1)
@@ -0,0 +1,129 @@
+import time
+import heapq
+import threading
+
+
+class TimerHandle(object):
+    # returned by TimerScheduler.schedule(). cancel() is O(1): the heap
+    # entry is only marked and dropped when it reaches the top.
+
+    def __init__(self, scheduler, callback):
+        self.scheduler = scheduler
+        self.callback = callback
+        self.deadline = None
+        self.cancelled = False
+        self.expired = False
+        self.__entry__ = None
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def reschedule(self, delay):
+        self.scheduler.reschedule(self, delay)
+
+    def remaining(self):
+        if self.cancelled or self.expired:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class TimerScheduler(object):
+    # One thread that owns every deadline. Timers live in a heap keyed
+    # on their time.monotonic() deadline; schedule and reschedule are
+    # O(log n), cancel is O(1). Callbacks run on the scheduler thread
+    # and should only hand work off (e.g. post an event), never block.
+
+    def __init__(self, name="TimerScheduler"):
+        self.name = name
+        self.__heap__ = []
+        self.__sequence__ = 0
+        self.__condition__ = threading.Condition()
+        self.__thread__ = None
+        self.__running__ = False
+
+    def schedule(self, delay, callback):
+        handle = TimerHandle(self, callback)
+        self.reschedule(handle, delay)
+        return handle
+
+    def reschedule(self, handle, delay):
+        with self.__condition__:
+            if handle.__entry__ is not None:
+                # orphan the old heap entry
+                handle.__entry__[2] = None
+
+            handle.cancelled = False
+            handle.expired = False
+            handle.deadline = time.monotonic() + delay
+
+            self.__sequence__ = self.__sequence__ + 1
+            entry = [handle.deadline, self.__sequence__, handle]
+            handle.__entry__ = entry
+            heapq.heappush(self.__heap__, entry)
+
+            self.__start__()
+            self.__condition__.notify()
+
+    def cancel(self, handle):
+        with self.__condition__:
+            handle.cancelled = True
+            if handle.__entry__ is not None:
+                handle.__entry__[2] = None
+                handle.__entry__ = None
+
+    def next_deadline(self):
+        # the earliest live deadline, or None
+        with self.__condition__:
+            self.__discard__()
+            if len(self.__heap__) == 0:
+                return None
+            return self.__heap__[0][0]
+
+    def stop(self):
+        with self.__condition__:
+            self.__running__ = False
+            self.__condition__.notify()
+        if self.__thread__ is not None:
+            self.__thread__.join()
+            self.__thread__ = None
+
+    def __len__(self):
+        with self.__condition__:
+            self.__discard__()
+            return sum(1 for entry in self.__heap__ if entry[2] is not None)
+
+    def __start__(self):
+        if self.__thread__ is None:
+            self.__running__ = True
+            self.__thread__ = threading.Thread(target=self.__run__, name=self.name, daemon=True)
+            self.__thread__.start()
+
+    def __discard__(self):
+        # pops cancelled entries off the top of the heap
+        while len(self.__heap__) > 0 and self.__heap__[0][2] is None:
+            heapq.heappop(self.__heap__)
+
+    def __run__(self):
+        while True:
+            with self.__condition__:
+                while self.__running__:
+                    self.__discard__()
+                    if len(self.__heap__) == 0:
+                        self.__condition__.wait()
+                        continue
+                    delay = self.__heap__[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.__condition__.wait(delay)
+                # end while
+
+                if not self.__running__:
+                    return
+
+                handle = heapq.heappop(self.__heap__)[2]
+                handle.__entry__ = None
+                handle.expired = True
+            # end with
+
+            # run the callback without holding the lock
+            handle.callback()
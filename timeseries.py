@@ -0,0 +1,389 @@
+import os
+import time
+import threading
+
+import numpy as np
+
+# Records are fixed width and little endian, with no file header,
+# so a segment can be np.memmap'ed directly. Times are float32
+# seconds from the segment start (the file name, in unix time).
+RAW_DTYPE = np.dtype([('offset', '<f4'), ('value', '<f4')])
+ROLLUP_DTYPE = np.dtype([('offset', '<f4'), ('min', '<f4'), ('max', '<f4'), ('mean', '<f4'), ('count', '<u4')])
+
+# query results carry absolute unix times
+RAW_RESULT = np.dtype([('t', '<f8'), ('value', '<f4')])
+ROLLUP_RESULT = np.dtype([('t', '<f8'), ('min', '<f4'), ('max', '<f4'), ('mean', '<f4'), ('count', '<u4')])
+
+# resolution -> (bucket seconds, segment seconds). At 80 SPS a raw
+# segment is about 2.3 MB, a day of 1 s rollups 1.7 MB and a week of
+# 1 min rollups 200 kB.
+LEVELS = {
+    'raw': (None, 3600),
+    '1s': (1, 86400),
+    '1min': (60, 7 * 86400),
+}
+
+# seconds each resolution is kept by prune()
+RETENTION = {
+    'raw': 2 * 86400,
+    '1s': 35 * 86400,
+    '1min': 400 * 86400,
+}
+
+
+class Rollup(object):
+    # Downsamples a time ordered stream into fixed buckets of
+    # min / max / mean / count, a whole batch at a time. The newest
+    # bucket stays open until a later sample (or close()) ends it.
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        # [start, min, max, sum, count] of the open bucket
+        self.open = None
+
+    def add(self, times, mins, maxs, sums, counts):
+        # returns the completed buckets as (starts, mins, maxs, sums, counts)
+        starts = np.floor(times / self.bucket) * self.bucket
+        index = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1))
+
+        buckets = [
+            starts[index],
+            np.minimum.reduceat(mins, index),
+            np.maximum.reduceat(maxs, index),
+            np.add.reduceat(sums, index),
+            np.add.reduceat(counts, index),
+        ]
+
+        if self.open is not None:
+            start, low, high, total, count = self.open
+            if buckets[0][0] == start:
+                buckets[1][0] = min(buckets[1][0], low)
+                buckets[2][0] = max(buckets[2][0], high)
+                buckets[3][0] = buckets[3][0] + total
+                buckets[4][0] = buckets[4][0] + count
+            else:
+                buckets = [np.concatenate(([value], column)) for value, column in zip(self.open, buckets)]
+        # end if
+
+        self.open = [column[-1] for column in buckets]
+        return [column[:-1] for column in buckets]
+
+    def close(self):
+        # ends the open bucket; returns it like add() does
+        if self.open is None:
+            return None
+        buckets = [np.array([value]) for value in self.open]
+        self.open = None
+        return buckets
+
+
+class TimeSeries(object):
+    # Append only store for one channel of samples, e.g. a load cell
+    # weight. Each resolution is a directory of fixed width segment
+    # files; 1 s and 1 min min/max/mean rollups are built as samples
+    # are appended. Range queries memory map the segments and slice
+    # them with a binary search, returning numpy structured arrays
+    # without decoding row by row.
+    #
+    # Samples are buffered and written every flush_samples samples or
+    # flush_interval seconds. Samples older than the last one stored
+    # (e.g. after the wall clock is stepped back) are dropped. Segments
+    # past their retention are pruned every prune_interval seconds.
+    #
+    # On start-up the rollups are rebuilt from the raw samples (and
+    # 1 s buckets) stored after the last finished bucket, so an unclean
+    # stop loses no rollup data. A bucket written by close() and
+    # continued after a restart is stored twice; query() merges
+    # records with the same time.
+
+    def __init__(self, path, flush_samples=4096, flush_interval=5.0, retention=None, prune_interval=3600.0):
+        self.path = path
+        self.flush_samples = flush_samples
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self.retention = dict(RETENTION)
+        if retention is not None:
+            self.retention.update(retention)
+
+        for resolution in LEVELS:
+            os.makedirs(os.path.join(self.path, resolution), exist_ok=True)
+
+        self.rollups = {
+            '1s': Rollup(LEVELS['1s'][0]),
+            '1min': Rollup(LEVELS['1min'][0]),
+        }
+
+        self.__lock__ = threading.RLock()
+        self.__times__ = []
+        self.__values__ = []
+        self.__pending__ = 0
+        self.__last_flush__ = time.monotonic()
+        self.__last_time__ = self.__stored_until__()
+        self.__last_prune__ = None
+
+        # statistics
+        self.samples = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+        self.__recover__()
+
+    def append(self, times, values, monotonic=False):
+        # times are unix times, or time.monotonic() times when
+        # monotonic is True (as the LoadCell sampler records them)
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float32)
+        if len(times) == 0:
+            return
+        if monotonic:
+            times = times + (time.time() - time.monotonic())
+
+        with self.__lock__:
+            keep = times > self.__last_time__
+            keep[1:] = keep[1:] & (np.diff(times) > 0)
+            if not keep.all():
+                self.dropped = self.dropped + int(len(keep) - np.count_nonzero(keep))
+                times = times[keep]
+                values = values[keep]
+            if len(times) == 0:
+                return
+            self.__last_time__ = times[-1]
+
+            self.__times__.append(times)
+            self.__values__.append(values)
+            self.__pending__ = self.__pending__ + len(times)
+            self.samples = self.samples + len(times)
+
+            if self.__pending__ >= self.flush_samples or \
+                    time.monotonic() - self.__last_flush__ >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        # writes the buffered samples and the rollup buckets they complete
+        with self.__lock__:
+            self.__last_flush__ = time.monotonic()
+            if self.__pending__ == 0:
+                return
+
+            times = np.concatenate(self.__times__)
+            values = np.concatenate(self.__values__)
+            self.__times__ = []
+            self.__values__ = []
+            self.__pending__ = 0
+
+            self.__write__('raw', times, value=values)
+
+            seconds = self.rollups['1s'].add(times, values, values, values.astype(np.float64),
+                                             np.ones(len(values), dtype=np.uint32))
+            self.__write_rollup__('1s', seconds)
+
+            if self.__last_prune__ is None or \
+                    self.__last_flush__ - self.__last_prune__ >= self.prune_interval:
+                self.__last_prune__ = self.__last_flush__
+                self.prune()
+
+    def close(self):
+        # writes everything, including the open rollup buckets
+        with self.__lock__:
+            self.flush()
+            self.__write_rollup__('1s', self.rollups['1s'].close())
+            self.__write_rollup__('1min', self.rollups['1min'].close())
+
+    def query(self, start, end, resolution='raw'):
+        # samples with start <= t < end, oldest first, as a structured
+        # array: fields t, value for 'raw'; t, min, max, mean, count for
+        # '1s' and '1min'. Rollup buckets still open are not included.
+        if resolution not in LEVELS:
+            raise ValueError("Unknown resolution %s." % resolution)
+        self.flush()
+
+        segment = LEVELS[resolution][1]
+        dtype = RAW_DTYPE if resolution == 'raw' else ROLLUP_DTYPE
+        result_dtype = RAW_RESULT if resolution == 'raw' else ROLLUP_RESULT
+
+        parts = []
+        for segment_start, filename in self.__segments__(resolution):
+            if segment_start >= end or segment_start + segment <= start:
+                continue
+            records = self.__map__(filename, dtype)
+            if len(records) == 0:
+                continue
+
+            offsets = records['offset']
+            first = np.searchsorted(offsets, np.float32(start - segment_start), 'left')
+            last = np.searchsorted(offsets, np.float32(end - segment_start), 'left')
+            if last <= first:
+                continue
+
+            part = np.empty(last - first, dtype=result_dtype)
+            part['t'] = offsets[first:last] + np.float64(segment_start)
+            for name in dtype.names[1:]:
+                part[name] = records[name][first:last]
+            parts.append(part)
+        # end for
+
+        if len(parts) == 0:
+            return np.empty(0, dtype=result_dtype)
+        result = np.concatenate(parts)
+        if resolution != 'raw':
+            result = __merge__(result)
+        return result
+
+    def prune(self, now=None):
+        # deletes segments past their resolution's retention;
+        # returns the number of files removed
+        if now is None:
+            now = time.time()
+        removed = 0
+        with self.__lock__:
+            for resolution, (_, segment) in LEVELS.items():
+                for segment_start, filename in self.__segments__(resolution):
+                    if segment_start + segment < now - self.retention[resolution]:
+                        os.remove(filename)
+                        removed = removed + 1
+            # end for
+        return removed
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "dropped": self.dropped,
+            "pending": self.__pending__,
+            "bytes_written": self.bytes_written,
+        }
+
+    def __write_rollup__(self, resolution, buckets):
+        if buckets is None or len(buckets[0]) == 0:
+            return
+        starts, mins, maxs, sums, counts = buckets
+        self.__write__(resolution, starts, min=mins, max=maxs, mean=sums / counts, count=counts)
+
+        # the 1 min level is built from the finished 1 s buckets
+        if resolution == '1s':
+            minutes = self.rollups['1min'].add(starts, mins, maxs, sums, counts)
+            self.__write_rollup__('1min', minutes)
+
+    def __write__(self, resolution, times, **fields):
+        # appends records, split at segment boundaries
+        segment = LEVELS[resolution][1]
+        dtype = RAW_DTYPE if resolution == 'raw' else ROLLUP_DTYPE
+
+        segment_starts = (np.floor(times / segment) * segment).astype(np.int64)
+        index = np.concatenate(([0], np.flatnonzero(np.diff(segment_starts)) + 1, [len(times)]))
+        for first, last in zip(index[:-1], index[1:]):
+            segment_start = int(segment_starts[first])
+            records = np.empty(last - first, dtype=dtype)
+            records['offset'] = times[first:last] - segment_start
+            for name, column in fields.items():
+                records[name] = column[first:last]
+
+            filename = os.path.join(self.path, resolution, "%d.bin" % segment_start)
+            with open(filename, 'ab') as f:
+                # drop a torn record left by a power cut
+                size = f.tell()
+                if size % dtype.itemsize != 0:
+                    f.truncate(size - size % dtype.itemsize)
+                f.write(records.tobytes())
+            self.bytes_written = self.bytes_written + records.nbytes
+        # end for
+
+    def __segments__(self, resolution):
+        # (segment start, filename) of every segment, oldest first
+        directory = os.path.join(self.path, resolution)
+        segments = []
+        for name in os.listdir(directory):
+            if name.endswith('.bin'):
+                segments.append((int(name[:-4]), os.path.join(directory, name)))
+        segments.sort()
+        return segments
+
+    def __map__(self, filename, dtype):
+        count = os.path.getsize(filename) // dtype.itemsize
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode='r', shape=(count,))
+
+    def __recover__(self):
+        # rebuilds the open rollup buckets from what is stored after
+        # the last finished one, writing the buckets that completed
+        # before the stop. 1 s buckets after the last 1 min bucket go
+        # into the 1 min rollup first, then the raw samples after the
+        # last 1 s bucket through flush()'s path.
+        with self.__lock__:
+            minutes = self.__last_bucket__('1min')
+            seconds = self.query(minutes, np.inf, '1s')
+            if len(seconds) > 0:
+                counts = seconds['count']
+                completed = self.rollups['1min'].add(seconds['t'], seconds['min'], seconds['max'],
+                                                     seconds['mean'] * counts.astype(np.float64), counts)
+                self.__write_rollup__('1min', completed)
+
+            raw = self.query(self.__last_bucket__('1s'), np.inf, 'raw')
+            if len(raw) > 0:
+                values = raw['value']
+                completed = self.rollups['1s'].add(raw['t'], values, values, values.astype(np.float64),
+                                                   np.ones(len(values), dtype=np.uint32))
+                self.__write_rollup__('1s', completed)
+
+    def __last_bucket__(self, resolution):
+        # end of the newest bucket stored at a resolution
+        for segment_start, filename in reversed(self.__segments__(resolution)):
+            records = self.__map__(filename, ROLLUP_DTYPE)
+            if len(records) > 0:
+                return float(records['offset'][-1]) + segment_start + LEVELS[resolution][0]
+        return 0.0
+
+    def __stored_until__(self):
+        # time of the newest raw sample on disk, so a restart
+        # keeps appending in order
+        segments = self.__segments__('raw')
+        for segment_start, filename in reversed(segments):
+            records = self.__map__(filename, RAW_DTYPE)
+            if len(records) > 0:
+                return float(records['offset'][-1]) + segment_start
+        return 0.0
+
+
+def __merge__(records):
+    # combines rollup records with the same time, oldest first, e.g.
+    # a bucket written by close() and continued after a restart
+    if len(records) < 2:
+        return records
+    index = np.concatenate(([0], np.flatnonzero(np.diff(records['t'])) + 1))
+    if len(index) == len(records):
+        return records
+
+    counts = records['count']
+    sums = records['mean'] * counts.astype(np.float64)
+    merged = np.empty(len(index), dtype=records.dtype)
+    merged['t'] = records['t'][index]
+    merged['min'] = np.minimum.reduceat(records['min'], index)
+    merged['max'] = np.maximum.reduceat(records['max'], index)
+    merged['count'] = np.add.reduceat(counts, index)
+    merged['mean'] = np.add.reduceat(sums, index) / merged['count']
+    return merged
+
+
+class TimeSeriesStore(object):
+    # a directory of named TimeSeries, e.g. one per load cell channel
+
+    def __init__(self, path='timeseries', **kwargs):
+        self.path = path
+        self.kwargs = kwargs
+        self.series = {}
+        self.__lock__ = threading.Lock()
+
+    def get(self, name):
+        with self.__lock__:
+            series = self.series.get(name)
+            if series is None:
+                series = TimeSeries(os.path.join(self.path, name), **self.kwargs)
+                self.series[name] = series
+            return series
+
+    def prune(self, now=None):
+        return sum(series.prune(now) for series in list(self.series.values()))
+
+    def close(self):
+        for series in list(self.series.values()):
+            series.close()